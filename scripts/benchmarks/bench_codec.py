@@ -0,0 +1,77 @@
+"""
+Benchmark of the JSON layer in liveagent.codec.
+
+Reports, per page, the time to decode an API response for the standard library and for the backend selected
+by liveagent.codec. JSON columns are always encoded by the standard library and are not measured. If ijson is
+installed, incremental parsing of a v1 conversations response is measured as well.
+
+Usage: python scripts/benchmarks/bench_codec.py [--pages 20] [--page-size 500]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+
+from liveagent import codec  # noqa: E402
+
+
+def make_ticket(i):
+
+    return {'id': f't{i}', 'owner_contactid': 'c1', 'owner_email': 'john@example.com', 'owner_name': 'Jöhn Doe',
+            'departmentid': 'd1', 'agentid': 'a1', 'status': 'R', 'tags': ['vip', 'billing', 'ř'], 'code': 'XYZ-123',
+            'channel_type': 'E', 'date_created': '2021-01-01 10:00:00', 'date_changed': '2021-01-02 10:00:00',
+            'date_resolved': None, 'date_due': None, 'date_deleted': None, 'last_activity': '2021-01-02 10:00:00',
+            'last_activity_public': '2021-01-02 10:00:00', 'public_access_urlcode': 'abc', 'subject': 'Hello',
+            'custom_fields': [{'code': 'field', 'value': 'value'}, {'code': 'other', 'value': 12.5}]}
+
+
+def make_conversation(i):
+
+    return {'conversationid': f'cv{i}', 'code': 'ABC', 'datecreated': '2021-01-01 10:00:00',
+            'datechanged': '2021-01-02 10:00:00', 'datedue': None, 'departmentid': 'd1', 'departmentname': 'Support',
+            'status': 'R', 'ownername': 'John', 'owneremail': 'john@example.com', 'subject': 'Hello',
+            'preview': 'Lorem ipsum dolor sit amet. ' * 5, 'publicurlcode': 'x', 'tags': 'a,b', 'channel_type': 'E',
+            'messagegroupsin': 2, 'messagegroupsout': 3}
+
+
+def timed(func, repeat):
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args()
+
+    tickets = [make_ticket(i) for i in range(args.page_size)]
+    tickets_raw = json.dumps(tickets).encode('utf-8')
+
+    print(f"Backend: {codec.BACKEND}, incremental parsing: {codec.STREAMING}")
+    print(f"tickets page: {args.page_size} rows, {len(tickets_raw) / 1024:.0f} kB")
+
+    decode_std = timed(lambda: json.loads(tickets_raw), args.pages)
+    decode_codec = timed(lambda: codec.loads(tickets_raw), args.pages)
+    print(f"  decode per page: json {decode_std:.2f} ms | codec {decode_codec:.2f} ms")
+
+    conversations = {'response': {'conversations': [make_conversation(i) for i in range(args.page_size * 2)]}}
+    conversations_raw = json.dumps(conversations).encode('utf-8')
+    print(f"conversations page: {args.page_size * 2} rows, {len(conversations_raw) / 1024:.0f} kB")
+
+    decode_full = timed(lambda: codec.loads(conversations_raw)['response']['conversations'], args.pages)
+    decode_stream = timed(lambda: list(codec.iter_items(io.BytesIO(conversations_raw), 'response.conversations')),
+                          args.pages)
+    print(f"  decode per page: full {decode_full:.2f} ms | incremental {decode_stream:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
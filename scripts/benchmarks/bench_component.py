@@ -0,0 +1,151 @@
+"""
+End-to-end benchmark of Component.run against the local LiveAgent API stand-in (mock_server.py).
+
+Every object is extracted in a separate process, so peak memory is measured per object. For each object,
+the benchmark reports wall time, rows written, rows per second, requests per second, connections opened
+to the API and peak RSS.
+
+Usage:
+    python scripts/benchmarks/bench_component.py --size 20000 --latency 0.02
+    python scripts/benchmarks/bench_component.py --objects tickets_messages --params '{"max_workers": 8}'
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', '..', 'src')
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+
+import mock_server  # noqa: E402
+
+OBJECTS = ['agents', 'calls', 'companies', 'contacts', 'departments', 'tags', 'tickets', 'tickets_messages',
+           'tickets_history', 'agent_report', 'ranking_agents_report', 'agent_availability',
+           'agent_availability_chats', 'calls_availability', 'conversations']
+
+
+def run_object(obj, port, date_from, date_until, params):
+    """
+    Runs the component for a single object. Executed in a child process.
+    """
+
+    data_dir = tempfile.mkdtemp(prefix=f'liveagent_bench_{obj}_')
+    os.makedirs(os.path.join(data_dir, 'in'))
+
+    config = {
+        'parameters': {
+            '#token': 'token',
+            '#token_v1': 'token',
+            'organization': 'benchmark',
+            'objects': [obj],
+            'date': {'from': date_from, 'until': date_until},
+            'incremental_load': 1,
+            **params
+        },
+        'image_parameters': {}
+    }
+
+    with open(os.path.join(data_dir, 'config.json'), 'w') as config_file:
+        json.dump(config, config_file)
+
+    os.environ['KBC_DATADIR'] = data_dir
+
+    from liveagent import client
+    from liveagent.component import Component
+
+    client.LADESK_URL = f'http://127.0.0.1:{port}/{{}}/api/'
+
+    start = time.perf_counter()
+    Component().run()
+    elapsed = time.perf_counter() - start
+
+    rows = 0
+    tables_path = os.path.join(data_dir, 'out', 'tables')
+    for name in os.listdir(tables_path):
+        path = os.path.join(tables_path, name)
+        if os.path.isfile(path) and name.endswith('.csv'):
+            with open(path, 'rb') as table:
+                rows += sum(1 for _ in table)
+
+    return {
+        'object': obj,
+        'seconds': elapsed,
+        'rows': rows,
+        'peak_rss_mb': get_peak_rss_mb()
+    }
+
+
+def get_peak_rss_mb():
+    """
+    Peak RSS of the current process. VmHWM is preferred, because ru_maxrss on Linux is inherited across exec
+    and would include the memory of the parent process, which hosts the mock server.
+    """
+
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', nargs='+', default=OBJECTS, choices=OBJECTS)
+    parser.add_argument('--size', type=int, default=10000, help='Number of rows of v3 objects and conversations.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay of every response in seconds.')
+    parser.add_argument('--connect-latency', type=float, default=0.0, help='Delay of every new connection.')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with 429.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503.')
+    parser.add_argument('--date-from', default='2021-01-01')
+    parser.add_argument('--date-until', default='2021-01-31')
+    parser.add_argument('--params', default='{}', help='JSON object merged into configuration parameters.')
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    params = json.loads(args.params)
+
+    if args.worker:
+        print(json.dumps(run_object(args.worker, args.port, args.date_from, args.date_until, params)))
+        return
+
+    server = mock_server.serve(size=args.size, latency=args.latency, throttle_rate=args.throttle_rate,
+                               error_rate=args.error_rate, connect_latency=args.connect_latency)
+
+    print(f"{'object':<26}{'seconds':>9}{'rows':>10}{'rows/s':>11}{'requests':>10}{'req/s':>9}{'conns':>7}"
+          f"{'peak MB':>9}")
+
+    for obj in args.objects:
+        requests_before = mock_server.Settings.requests
+        connections_before = mock_server.Settings.connections
+
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', obj,
+                                 '--port', str(server.server_port), '--date-from', args.date_from,
+                                 '--date-until', args.date_until, '--params', json.dumps(params)],
+                                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+        stats = json.loads(output.strip().splitlines()[-1])
+        requests = mock_server.Settings.requests - requests_before
+        connections = mock_server.Settings.connections - connections_before
+        seconds = max(stats['seconds'], 1e-9)
+
+        print(f"{obj:<26}{seconds:>9.2f}{stats['rows']:>10}{stats['rows'] / seconds:>11,.0f}"
+              f"{requests:>10}{requests / seconds:>9,.0f}{connections:>7}{stats['peak_rss_mb']:>9.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark of the startup of the component.
+
+Imports liveagent.component in fresh interpreters with -X importtime and reports the median cumulative import time
+of the module and of the slowest modules it imports. Modules, which are loaded only when needed (dateparser, the HTTP
+client stack, asyncio), must not be imported eagerly. The benchmark fails, if any of them is imported or the median
+exceeds the budget.
+
+Usage: python scripts/benchmarks/bench_startup.py [--repeat 5] [--budget-ms 150] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src')
+MODULE = 'liveagent.component'
+LAZY_MODULES = ['dateparser', 'requests', 'httpx', 'asyncio', 'liveagent.client', 'liveagent.planner']
+
+
+def run(code, *options):
+
+    _env = {**os.environ, 'PYTHONPATH': os.pathsep.join([SRC] + os.environ.get('PYTHONPATH', '').split(os.pathsep))}
+    return subprocess.run([sys.executable, *options, '-c', code], env=_env, capture_output=True, text=True, check=True)
+
+
+def import_times(code):
+    """
+    Returns cumulative import times in milliseconds of all modules imported by the code.
+    """
+
+    _process = run(code, '-X', 'importtime')
+
+    times = {}
+    for line in _process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, _cumulative, _name = line[len('import time:'):].split('|')
+        times[_name.strip()] = int(_cumulative) / 1000
+
+    return times
+
+
+def imported_modules():
+
+    return set(run(f'import sys, {MODULE}; print(*sys.modules)').stdout.split())
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=150)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    # modules imported by the interpreter at startup (site) are not reported
+    _startup = import_times('pass')
+    runs = [import_times(f'import {MODULE}') for _ in range(args.repeat)]
+    totals = [times[MODULE] for times in runs]
+    median = statistics.median(totals)
+
+    print(f"Import of {MODULE}: median {median:.1f} ms, min {min(totals):.1f} ms, max {max(totals):.1f} ms "
+          f"over {args.repeat} runs")
+
+    slowest = {name: statistics.median(times.get(name, 0) for times in runs) for name in runs[0]
+               if name != MODULE and name not in _startup}
+    for name, ms in sorted(slowest.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<40}{ms:>10.1f} ms")
+
+    _eager = sorted(set(LAZY_MODULES) & imported_modules())
+    failed = False
+
+    if _eager:
+        print(f"FAIL: modules imported eagerly: {', '.join(_eager)}")
+        failed = True
+
+    if median > args.budget_ms:
+        print(f"FAIL: median import time {median:.1f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+        failed = True
+
+    if not failed:
+        print(f"OK: within the budget of {args.budget_ms:.0f} ms")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Micro-benchmark of LiveAgentWriter.writerows on large synthetic pages.
+
+Compares the previous implementation (flatten every row, filter keys against the field list, write with DictWriter)
+with the compiled RowProjector and QuotedRowWriter and reports rows per second for each table.
+
+Usage: python scripts/benchmarks/bench_writer.py [--pages 40] [--page-size 500]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+
+from liveagent import result  # noqa: E402
+
+
+class LegacyWriter:
+
+    def __init__(self, fields, jsonFields, file):
+
+        self.paramFields = fields
+        self.paramJsonFields = jsonFields
+        self.writer = csv.DictWriter(file, fieldnames=fields, restval='', extrasaction='ignore', quotechar='\"',
+                                     quoting=csv.QUOTE_ALL)
+
+    def writerows(self, listToWrite, parentDict=None):
+
+        for row in listToWrite:
+
+            row_f = self.flatten_json(x=row)
+
+            if self.paramJsonFields != []:
+                for field in self.paramJsonFields:
+                    row_f[field] = json.dumps(row[field])
+
+            _dictToWrite = {}
+
+            for key, value in row_f.items():
+
+                if key in self.paramFields:
+                    _dictToWrite[key] = value
+
+            if parentDict is not None:
+                _dictToWrite = {**_dictToWrite, **parentDict}
+
+            self.writer.writerow(_dictToWrite)
+
+    def flatten_json(self, x, out=None, name=''):
+        if out is None:
+            out = dict()
+
+        if type(x) is dict:
+            for a in x:
+                self.flatten_json(x[a], out, name + a + '_')
+        else:
+            out[name[:-1]] = x
+
+        return out
+
+
+class ProjectorWriter:
+
+    def __init__(self, fields, jsonFields, file):
+
+        self.projector = result.RowProjector(fields, jsonFields)
+        self.writer = result.QuotedRowWriter(file)
+
+    def writerows(self, listToWrite, parentDict=None):
+
+        _project = self.projector.project
+        self.writer.writerows(_project(row, parentDict) for row in listToWrite)
+
+
+def make_row(table, i):
+
+    if table == 'tickets_messages_content':
+        return {'id': f'c{i}', 'message_id': f'm{i}', 'userid': 'u123', 'type': 'M',
+                'datecreated': '2021-01-01 10:00:00', 'format': 'H', 'visibility': 'P',
+                'message': '<p>' + 'Lorem ipsum dolor sit amet. ' * 40 + '</p>',
+                'attachments': [{'id': 'a', 'name': 'file.pdf'}], 'meta': {'source': 'mail', 'size': 1234}}
+
+    return {'id': f't{i}', 'owner_contactid': 'c1', 'owner_email': 'john@example.com', 'owner_name': 'John Doe',
+            'departmentid': 'd1', 'agentid': 'a1', 'status': 'R', 'tags': ['vip', 'billing'], 'code': 'XYZ-123',
+            'channel_type': 'E', 'date_created': '2021-01-01 10:00:00', 'date_changed': '2021-01-02 10:00:00',
+            'date_resolved': None, 'date_due': None, 'date_deleted': None, 'last_activity': '2021-01-02 10:00:00',
+            'last_activity_public': '2021-01-02 10:00:00', 'public_access_urlcode': 'abc', 'subject': 'Hello',
+            'custom_fields': [{'code': 'field', 'value': 'value'}], 'extra': {'nested': {'deep': 1}}}
+
+
+def run(writer_class, table, pages):
+
+    fields = getattr(result, f'FIELDS_{table.upper()}')
+    json_fields = getattr(result, f'JSON_{table.upper()}')
+    out = io.StringIO()
+    writer = writer_class(fields, json_fields, out)
+
+    start = time.perf_counter()
+    for page in pages:
+        writer.writerows(page)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, out.getvalue()
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args()
+
+    for table in ['tickets', 'tickets_messages_content']:
+        pages = [[make_row(table, p * args.page_size + i) for i in range(args.page_size)] for p in range(args.pages)]
+        rows = args.pages * args.page_size
+
+        legacy_time, legacy_out = run(LegacyWriter, table, pages)
+        projector_time, projector_out = run(ProjectorWriter, table, pages)
+
+        assert legacy_out == projector_out, f"Output of {table} differs between implementations."
+
+        print(f"{table}: {rows} rows | before {rows / legacy_time:,.0f} rows/s | "
+              f"after {rows / projector_time:,.0f} rows/s | speedup {legacy_time / projector_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+Local stand-in for the LiveAgent API, used by the offline benchmarks.
+
+Reproduces the pagination of both API versions:
+    - v3 page pagination (_page, _perPage) for agents, chats, companies, contacts, departments, tags, tickets
+      and ticket messages,
+    - v3 cursor pagination (_cursor, _perPage, next_page_cursor header) for calls and tickets history,
+    - v1 limitfrom/limitcount pagination for reports and offset/limit pagination for conversations.
+
+Date filters passed in _filters are applied, as well as the datechanged, channel_type and sort_field filters
+of conversations, which are needed by keyset pagination. Latency can be added to every request and a share of requests
+can be answered with 429 (with a Retry-After header) or 503. Responses are gzip compressed, if the client accepts it,
+and every new connection can be delayed to account for the TCP and TLS handshake of the real API.
+
+Usage: python scripts/benchmarks/mock_server.py --port 8080 --size 10000 --latency 0.05
+The API is then available at http://127.0.0.1:8080/<organization>/api/.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATASET_START = datetime.datetime(2021, 1, 1)
+DATASET_DAYS = 30
+
+V3_PAGED = ['agents', 'chats', 'companies', 'contacts', 'departments', 'tags', 'tickets']
+V3_CURSOR = {'calls': 'calls', 'tickets/history': 'tickets_history'}
+V1 = {
+    'reports/agents': ('agents', 'agent_report'),
+    'reports/ranking': ('ranks', 'ranking'),
+    'reports/tickets/agentsavailability': ('agentsavailability', 'availability'),
+    'reports/chats/agentsavailability': ('agentsavailability', 'availability'),
+    'reports/calls/availability': ('availability', 'calls_availability'),
+    'conversations': ('conversations', 'conversations')
+}
+V1_REPORT_SIZE = 50
+MESSAGES_PER_TICKET = 3
+CONTENTS_PER_MESSAGE = 2
+
+# filter fields used by the extractor, mapped to the fields of returned rows
+FILTER_FIELDS = {'datechanged': 'date_changed'}
+
+
+class Settings:
+
+    size = 10000
+    latency = 0.0
+    connect_latency = 0.0
+    throttle_rate = 0.0
+    error_rate = 0.0
+    retry_after = 1
+
+    requests = 0
+    connections = 0
+    lock = threading.Lock()
+    datasets = {}
+
+
+def timestamp(idx, size):
+
+    _offset = datetime.timedelta(seconds=idx * DATASET_DAYS * 86400 // max(size, 1))
+    return (DATASET_START + _offset).strftime(DATE_FORMAT)
+
+
+def make_row(kind, idx, size):
+
+    ts = timestamp(idx, size)
+
+    if kind == 'tickets':
+        return {'id': f't{idx:08d}', 'owner_contactid': f'c{idx % 97}', 'owner_email': 'john@example.com',
+                'owner_name': 'John Doe', 'departmentid': 'd1', 'agentid': f'a{idx % 13}', 'status': 'R',
+                'tags': ['vip', 'billing'], 'code': f'ABC-{idx}', 'channel_type': 'E', 'date_created': ts,
+                'date_changed': ts, 'date_resolved': ts, 'date_due': None, 'date_deleted': None, 'last_activity': ts,
+                'last_activity_public': ts, 'public_access_urlcode': 'x', 'subject': f'Ticket {idx}',
+                'custom_fields': [{'code': 'priority', 'value': 'high'}]}
+
+    elif kind == 'calls':
+        return {'id': f'call{idx}', 'ticketId': f't{idx:08d}', 'type': 'I', 'fromNumber': '+420123',
+                'fromName': 'John', 'toNumber': '+420456', 'toName': 'Support', 'viaNumber': '+420789',
+                'dateCreated': ts, 'dateAnswered': ts, 'dateFinished': ts, 'callDuration': idx % 600}
+
+    elif kind == 'tickets_history':
+        return {'id': f'h{idx}', 'conversation_id': f't{idx:08d}', 'conversation_code': f'ABC-{idx}',
+                'department_id': 'd1', 'agent_id': f'a{idx % 13}', 'status': 'R', 'date_from': ts, 'date_to': ts,
+                'elapsed_time': idx % 3600}
+
+    elif kind == 'conversations':
+        return {'conversationid': f'cv{idx:08d}', 'code': f'ABC-{idx}', 'datecreated': ts, 'datechanged': ts,
+                'datedue': None, 'departmentid': 'd1', 'departmentname': 'Support', 'status': 'R',
+                'ownername': 'John', 'owneremail': 'john@example.com', 'subject': f'Conversation {idx}',
+                'preview': 'Lorem ipsum dolor sit amet.', 'publicurlcode': 'x', 'tags': '',
+                'channel_type': 'EBMC'[idx % 4], 'messagegroupsin': idx % 5, 'messagegroupsout': idx % 7}
+
+    elif kind == 'agent_report':
+        return {'id': f'a{idx}', 'contactid': f'c{idx}', 'firstname': 'John', 'lastname': 'Doe', 'worktime': '7.5',
+                'answers': str(idx % 40), 'calls': str(idx % 20), 'chats': str(idx % 30)}
+
+    elif kind == 'ranking':
+        return {'id': f'r{idx}', 'rankingType': 'R', 'datecreated': ts, 'conversationid': f'cv{idx}',
+                'agentcontactid': f'a{idx % 13}', 'agentEmail': 'agent@example.com', 'agent': 'Agent',
+                'contactid': f'c{idx}', 'requesterEmail': 'john@example.com', 'requester': 'John', 'comment': ''}
+
+    elif kind == 'availability':
+        return {'id': f'av{idx}', 'userid': f'a{idx % 13}', 'from_date': ts, 'to_date': ts, 'firstname': 'John',
+                'lastname': 'Doe', 'contactid': f'c{idx}', 'departmentid': 'd1', 'department_name': 'Support',
+                'hours_online': '7.5'}
+
+    elif kind == 'calls_availability':
+        return {'date': ts[:10], 'mins': idx % 600, 'pct': idx % 100}
+
+    return {'id': f'{kind}{idx}', 'name': f'{kind} {idx}', 'email': 'john@example.com', 'role': 'A',
+            'firstname': 'John', 'lastname': 'Doe', 'date_created': ts, 'date_changed': ts,
+            'emails': ['john@example.com'], 'phones': ['+420123'], 'groups': [], 'custom_fields': [],
+            'department_id': f'd{idx}', 'agent_ids': ['a1'], 'color': '#fff', 'background_color': '#000'}
+
+
+def get_dataset(kind, size):
+
+    with Settings.lock:
+        if (kind, size) not in Settings.datasets:
+            Settings.datasets[(kind, size)] = [make_row(kind, idx, size) for idx in range(size)]
+
+        return Settings.datasets[(kind, size)]
+
+
+def apply_filters(rows, filters):
+
+    if not filters:
+        return rows
+
+    for field, operator, value in json.loads(filters):
+        field = FILTER_FIELDS.get(field, field)
+
+        if operator.startswith('D'):
+            operator, value, length = operator[1:], value[:10], 10
+        else:
+            length = None
+
+        def _value(row):
+            return (row.get(field) or '')[:length]
+
+        if operator == '>=':
+            rows = [r for r in rows if _value(r) >= value]
+        elif operator == '<=':
+            rows = [r for r in rows if _value(r) <= value]
+        elif operator == '>':
+            rows = [r for r in rows if _value(r) > value]
+        elif operator == '<':
+            rows = [r for r in rows if _value(r) < value]
+
+    return rows
+
+
+def apply_v1_filters(rows, query):
+
+    if query.get('datechanged', '').startswith('gt:'):
+        rows = [r for r in rows if r['datechanged'] > query['datechanged'][3:]]
+
+    if 'channel_type' in query:
+        rows = [r for r in rows if r['channel_type'] in query['channel_type'].split(',')]
+
+    if 'sort_field' in query:
+        rows = sorted(rows, key=lambda r: r[query['sort_field']], reverse=query.get('sort_direction') == 'DESC')
+
+    return rows
+
+
+def ticket_messages(ticket_id):
+
+    return [{'id': f'{ticket_id}-m{m}', 'parent_id': '', 'userid': 'u1', 'user_full_name': 'John Doe', 'type': 'M',
+             'status': 'R', 'datecreated': '2021-01-01 10:00:00', 'datefinished': '', 'sort_order': m,
+             'mail_msg_id': '', 'pop3_msg_id': '',
+             'messages': [{'id': f'{ticket_id}-m{m}-c{c}', 'userid': 'u1', 'type': 'M',
+                           'datecreated': '2021-01-01 10:00:00', 'format': 'H',
+                           'message': '<p>' + 'Lorem ipsum dolor sit amet. ' * 20 + '</p>', 'visibility': 'P'}
+                          for c in range(CONTENTS_PER_MESSAGE)]}
+            for m in range(MESSAGES_PER_TICKET)]
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, with Nagle's algorithm every reused connection would wait
+    # for the delayed ACK of the client (~40 ms) before the body is sent
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+
+        super().setup()
+
+        with Settings.lock:
+            Settings.connections += 1
+
+        if Settings.connect_latency:
+            time.sleep(Settings.connect_latency)
+
+    def send_json(self, status, body, headers=None):
+
+        raw = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            raw = gzip.compress(raw, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(raw)))
+
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+
+        with Settings.lock:
+            Settings.requests += 1
+
+        if Settings.latency:
+            time.sleep(Settings.latency)
+
+        if random.random() < Settings.throttle_rate:
+            return self.send_json(429, {'message': 'Too many requests'}, {'Retry-After': str(Settings.retry_after)})
+
+        if random.random() < Settings.error_rate:
+            return self.send_json(503, {'message': 'Service unavailable'})
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.split('/api/', 1)[-1].strip('/')
+
+        if path.startswith('v3/'):
+            return self.handle_v3(path[3:], query)
+
+        elif path in V1:
+            return self.handle_v1(path, query)
+
+        return self.send_json(404, {'message': f'Unknown endpoint {path}'})
+
+    def handle_v3(self, resource, query):
+
+        per_page = int(query.get('_perPage', 10))
+
+        if resource in V3_CURSOR:
+            rows = apply_filters(get_dataset(V3_CURSOR[resource], Settings.size), query.get('_filters'))
+            cursor = int(query.get('_cursor') or 0)
+            headers = {'next_page_cursor': str(cursor + per_page)} if cursor + per_page < len(rows) else {}
+            return self.send_json(200, rows[cursor:cursor + per_page], headers)
+
+        elif resource.startswith('tickets/') and resource.endswith('/messages'):
+            rows = ticket_messages(resource.split('/')[1])
+
+        elif resource in V3_PAGED:
+            rows = apply_filters(get_dataset(resource, Settings.size), query.get('_filters'))
+
+        else:
+            return self.send_json(404, {'message': f'Unknown endpoint v3/{resource}'})
+
+        page = int(query.get('_page', 1))
+        return self.send_json(200, rows[(page - 1) * per_page:page * per_page])
+
+    def handle_v1(self, path, query):
+
+        result_key, kind = V1[path]
+        rows = get_dataset(kind, Settings.size if kind == 'conversations' else V1_REPORT_SIZE)
+
+        if kind == 'conversations':
+            rows = apply_v1_filters(rows, query)
+
+        if 'limitfrom' in query:
+            offset, limit = int(query['limitfrom']), int(query['limitcount'])
+        else:
+            offset, limit = int(query.get('offset', 0)), int(query.get('limit', 100))
+
+        return self.send_json(200, {'response': {result_key: rows[offset:offset + limit]}})
+
+
+class Server(ThreadingHTTPServer):
+
+    # the default backlog of 5 drops connections opened at once by many parallel clients
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def serve(port=0, size=None, latency=None, throttle_rate=None, error_rate=None, connect_latency=None):
+    """
+    Starts the server on a background thread and returns it. The bound port is available as server.server_port.
+    """
+
+    for attr, value in [('size', size), ('latency', latency), ('throttle_rate', throttle_rate),
+                        ('error_rate', error_rate), ('connect_latency', connect_latency)]:
+        if value is not None:
+            setattr(Settings, attr, value)
+
+    server = Server(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--size', type=int, default=10000, help='Number of rows of v3 objects and conversations.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay of every response in seconds.')
+    parser.add_argument('--connect-latency', type=float, default=0.0, help='Delay of every new connection.')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with 429.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503.')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.size, args.latency, args.throttle_rate, args.error_rate, args.connect_latency)
+    print(f"LiveAgent API stand-in listening on http://127.0.0.1:{server.server_port}/<organization>/api/")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""
+Asynchronous engine of the LiveAgent client, used when many small requests (messages of tickets, daily reports)
+are downloaded at once. All requests are multiplexed on a single event loop, which runs in a background thread,
+instead of occupying one thread per request.
+
+The client has the same get_* methods as LiveAgentClient. They return a PagedRequest, which can be iterated over
+synchronously, so the rest of the component does not need to be asynchronous, or collected on the event loop
+for many items at once with map_pages.
+
+The engine requires httpx, which is an optional dependency.
+"""
+import asyncio
+import logging
+import ssl
+import threading
+import time
+from collections import deque
+from itertools import count, cycle
+from urllib.parse import urljoin
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import certifi
+    import httpx
+except ImportError:
+    httpx = None
+
+from liveagent import codec
+from liveagent.client import LiveAgentClient, ClientException, LIMIT_SIZE, PAGE_LIMIT, PAGE_RETRIES, \
+    RETRY_STATUS_CODES, THROTTLE_RETRIES, RATE_LIMIT, POOL_SIZE, PAGINATION_OFFSET
+from liveagent.metrics import RunMetrics
+from liveagent.utils import PendingBudget
+
+AVAILABLE = httpx is not None
+REQUEST_TIMEOUT = 300
+# the cost of scheduling a request in an httpx pool grows with the number of its connections, hence requests are
+# spread over several small pools
+POOL_SHARD_SIZE = 10
+
+_DONE = object()
+
+
+class PagedRequest:
+    """
+    Pages of a paginated request. Asynchronous iteration downloads the pages on the event loop of the client;
+    synchronous iteration passes the pages from the event loop to the calling thread one at a time.
+    """
+
+    def __init__(self, client: 'AsyncLiveAgentClient', pages: Callable[[], AsyncIterator[List]]):
+
+        self.client = client
+        self.pages = pages
+
+    def __aiter__(self) -> AsyncIterator[List]:
+
+        return self.pages()
+
+    def __iter__(self) -> Iterator[List]:
+
+        _pages = self.pages()
+
+        try:
+            while True:
+                page = self.client.run(self._next_page(_pages))
+
+                if page is _DONE:
+                    return
+
+                yield page
+
+        finally:
+            self.client.run(_pages.aclose())
+
+    @staticmethod
+    async def _next_page(pages: AsyncIterator[List]) -> Any:
+
+        try:
+            return await pages.__anext__()
+        except StopAsyncIteration:
+            return _DONE
+
+
+class AsyncLiveAgentClient(LiveAgentClient):
+
+    def __init__(self, token_v3: str, token_v1: str, organization: str, date_from: str, date_until: str,
+                 fail_on_error: bool = True, prefetch_pages: int = 1, rate_limit: float = RATE_LIMIT,
+                 metrics: RunMetrics = None, date_shards: int = 1, pool_size: int = POOL_SIZE,
+                 conversations_pagination: str = PAGINATION_OFFSET, channel_lanes: bool = False):
+
+        if not AVAILABLE:
+            raise ClientException("The asyncio engine requires package httpx, which is not installed.")
+
+        super().__init__(token_v3, token_v1, organization, date_from, date_until, fail_on_error, prefetch_pages,
+                         rate_limit, metrics, date_shards, pool_size, conversations_pagination, channel_lanes)
+
+        self.connections = 0
+        self.requests = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='liveagent-event-loop', daemon=True)
+        self.thread.start()
+
+        # a single SSL context is shared by all pools, each context holds its own copy of CA certificates
+        _ssl_context = ssl.create_default_context(cafile=certifi.where())
+        _limits = httpx.Limits(max_connections=POOL_SHARD_SIZE, max_keepalive_connections=POOL_SHARD_SIZE)
+        self.pools = [httpx.AsyncClient(headers=self._auth_header, timeout=REQUEST_TIMEOUT, limits=_limits,
+                                        verify=_ssl_context)
+                      for _ in range(max(1, -(-pool_size // POOL_SHARD_SIZE)))]
+        self.next_pool = cycle(self.pools)
+
+    def run(self, coroutine) -> Any:
+        """
+        Runs the coroutine on the event loop of the client and waits for its result.
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+
+        for pool in self.pools:
+            self.run(pool.aclose())
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        super().close()
+
+    def map_pages(self, get_pages: Callable[[Any], PagedRequest], items: Iterable, concurrency: int,
+                  size: Callable[[List[List]], int] = None,
+                  max_pending_size: int = None) -> Iterator[Tuple[Any, List[List], Exception]]:
+        """
+        Collects all pages of get_pages(item) for every item on the event loop, with at most concurrency requests
+        in flight, and yields (item, pages, exception) in order of items, the same way utils.ordered_map does,
+        including its limit on the size of results waiting for the consumer. Up to 2 * concurrency items are
+        scheduled ahead of the consumer.
+        """
+
+        _semaphore = asyncio.Semaphore(concurrency)
+        _pending = deque()
+        _budget = PendingBudget(max_pending_size)
+
+        async def _collect(item: Any) -> Tuple[Any, List[List], Exception, int]:
+
+            async with _semaphore:
+                try:
+                    pages = [page async for page in get_pages(item)]
+                except Exception as e:
+                    return item, None, e, 0
+
+                return item, pages, None, size(pages) if size is not None else 0
+
+        try:
+            for item in items:
+                _pending.append((item, asyncio.run_coroutine_threadsafe(_collect(item), self.loop)))
+
+                while _pending and (len(_pending) >= 2 * concurrency or _budget.is_exceeded(_pending)):
+                    yield _budget.consume(_pending.popleft()[1].result())
+
+            while _pending:
+                yield _budget.consume(_pending.popleft()[1].result())
+
+        finally:
+            for _, future in _pending:
+                future.cancel()
+
+    def get_pool_stats(self) -> Tuple[int, int]:
+
+        return self.connections, self.requests
+
+    def _get_paged_request(self, endpoint: str, parameters: Dict = None,
+                           result_key: str = None, method: str = 'page', limit_size: int = LIMIT_SIZE,
+                           limit_param: str = 'limitcount', offset_param: str = 'limitfrom',
+                           label: str = None, stream: bool = False, position: Dict = None) -> PagedRequest:
+        """
+        Same pagination as LiveAgentClient._get_paged_request, with pages downloaded on the event loop. Responses
+        are always decoded as a whole, stream is accepted for compatibility only.
+        """
+
+        position = {} if position is None else position
+
+        return PagedRequest(self, lambda: self._get_pages(endpoint, parameters, result_key, method, limit_size,
+                                                          limit_param, offset_param, label, position))
+
+    async def _get_pages(self, endpoint: str, parameters: Dict, result_key: str, method: str, limit_size: int,
+                         limit_param: str, offset_param: str, label: str, position: Dict) -> AsyncIterator[List]:
+
+        url_endpoint = urljoin(self.base_url, endpoint)
+        label = endpoint if label is None else label
+
+        if parameters is None:
+            parameters = {}
+
+        if method == 'page':
+
+            _next = position.get('page', 1)
+            par_endpoint = {**parameters, **{'_perPage': PAGE_LIMIT}}
+            par_pages = ({**par_endpoint, **{'_page': _page}} for _page in count(_next))
+
+            async for page in self._get_numbered_pages(endpoint, label, url_endpoint, par_pages, PAGE_LIMIT,
+                                                       lambda js_page: self._parse_page(js_page, result_key)):
+                _next += 1
+                position['page'] = _next
+                yield page
+
+        elif method == 'cursor':
+
+            if position.get('complete'):
+                return
+
+            _cursor = position.get('cursor')
+
+            while True:
+
+                par_page = {**parameters, **{'_cursor': _cursor, '_perPage': PAGE_LIMIT}}
+                rsp_page, js_page = await self._get_page_async(label, url_endpoint, par_page)
+
+                if rsp_page.status_code == 200:
+
+                    res_page = self._parse_page(js_page, result_key)
+                    _cursor = rsp_page.headers.get('next_page_cursor', None)
+                    position.update({'cursor': _cursor, 'complete': _cursor is None})
+
+                    yield res_page
+
+                    if _cursor is None:
+                        return
+
+                else:
+                    self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
+                                      f"Received: {rsp_page.status_code} - {rsp_page.text}.", endpoint)
+                    return
+
+        elif method == 'limit':
+
+            _next = position.get('offset', 0)
+            par_pages = ({**parameters, **{limit_param: limit_size, offset_param: offset}}
+                         for offset in count(_next, limit_size))
+
+            async for page in self._get_numbered_pages(endpoint, label, url_endpoint, par_pages, limit_size,
+                                                       lambda js_page: js_page['response'][result_key]):
+                _next += limit_size
+                position['offset'] = _next
+                yield page
+
+        elif method == 'keyset':
+
+            while not position.get('complete'):
+
+                par_page = self._get_keyset_parameters(parameters, position, limit_size, limit_param, offset_param)
+                rsp_page, js_page = await self._get_page_async(label, url_endpoint, par_page)
+
+                if rsp_page.status_code != 200:
+                    self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
+                                      f"Received: {rsp_page.status_code} - {rsp_page.text}.", endpoint)
+                    return
+
+                res_page = self._next_keyset_page(js_page['response'][result_key], position, limit_size)
+
+                if res_page:
+                    yield res_page
+
+        else:
+            raise ClientException(f"Unsupported pagination method {method}.")
+
+    async def _get_numbered_pages(self, endpoint: str, label: str, url: str, page_parameters: Iterator[Dict],
+                                  page_size: int, extract: Callable[[Any], List]) -> AsyncIterator[List]:
+
+        _tasks = deque()
+        _workers = 1
+
+        try:
+            while True:
+
+                while len(_tasks) < _workers:
+                    _tasks.append(asyncio.ensure_future(self._get_page_async(label, url, next(page_parameters))))
+
+                rsp_page, js_page = await _tasks.popleft()
+
+                if rsp_page.status_code != 200:
+                    self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
+                                      f"Received: {rsp_page.status_code} - {rsp_page.text}.", endpoint)
+                    return
+
+                res_page = extract(js_page)
+                yield res_page
+
+                if len(res_page) < page_size:
+                    return
+
+                _workers = self.parameters.prefetch_pages
+
+        finally:
+            for task in _tasks:
+                task.cancel()
+
+    async def _get_page_async(self, endpoint: str, url: str, parameters: Dict) -> Tuple[Any, Any]:
+        """
+        Same as LiveAgentClient._get_page, i.e. the same rate limiting, retries and backoff, without blocking
+        the event loop.
+        """
+
+        attempt = 0
+        throttled = 0
+        limiter = self._get_limiter(endpoint)
+        parameters = {key: value for key, value in parameters.items() if value is not None}
+
+        while True:
+
+            await limiter.acquire_async()
+            _start = time.perf_counter()
+
+            try:
+                self.requests += 1
+                rsp = await next(self.next_pool).get(url, params=parameters, extensions={'trace': self._trace})
+                self.metrics.record_request(endpoint, time.perf_counter() - _start)
+
+                if rsp.status_code == 200:
+                    limiter.success()
+                    return rsp, self._decode_response(endpoint, rsp)
+
+                elif rsp.status_code == 429 and throttled < THROTTLE_RETRIES:
+                    throttled += 1
+                    self.metrics.record_retry(endpoint)
+
+                    retry_after = self._get_retry_after(rsp, throttled)
+                    limiter.throttle(retry_after)
+                    logging.debug(f"Request to {endpoint} was throttled. Retrying in {retry_after:.1f} seconds "
+                                  f"with rate {limiter.rate * 60:.0f} requests per minute.")
+                    continue
+
+                elif rsp.status_code not in RETRY_STATUS_CODES or attempt >= PAGE_RETRIES:
+                    return rsp, None
+
+                reason = f"{rsp.status_code} - {rsp.text}"
+
+            except (httpx.HTTPError, ValueError) as e:
+                if isinstance(e, httpx.HTTPError):
+                    self.metrics.record_request(endpoint, time.perf_counter() - _start)
+
+                if attempt >= PAGE_RETRIES:
+                    raise ClientException(f"Could not download data for endpoint {endpoint} "
+                                          f"after {attempt} retries.\n{e}") from e
+
+                reason = str(e)
+
+            attempt += 1
+            self.metrics.record_retry(endpoint)
+
+            delay = self._get_backoff(attempt)
+            logging.debug(f"Retrying request to {endpoint} in {delay:.1f} seconds "
+                          f"(attempt {attempt}/{PAGE_RETRIES}). Reason: {reason}")
+            await asyncio.sleep(delay)
+
+    def _decode_response(self, endpoint: str, response: Any) -> Any:
+
+        _start = time.perf_counter()
+        document = codec.loads(response.content)
+        self.metrics.record_page(endpoint, len(response.content), time.perf_counter() - _start,
+                                 response.num_bytes_downloaded)
+
+        return document
+
+    async def _trace(self, event: str, info: Dict):
+
+        if event == 'connection.connect_tcp.complete':
+            self.connections += 1
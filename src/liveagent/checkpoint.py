@@ -0,0 +1,134 @@
+"""
+Checkpoint of a running extraction, which allows a run that failed or was restarted to resume where it stopped,
+instead of downloading everything again.
+
+Every object records its pagination position (page number, cursor, offset, date chunk or index of the last processed
+ticket) together with the size of its output tables after the last written page. The checkpoint is saved to a file
+periodically and whenever an object is finished. A resumed run truncates the tables to the recorded sizes and
+continues from the recorded positions. Checkpoints are valid only for the configuration they were saved with.
+
+The checkpoint is stored next to the output tables in the data folder, it is not part of the state. Only a run
+restarted with the same data folder resumes, a new job with a fresh data folder starts from the beginning.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_FILE = 'checkpoint.json'
+
+
+class Checkpoint:
+
+    def __init__(self, path: str, fingerprint: str, interval: float):
+
+        self.path = path
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.saved = time.monotonic()
+
+        _data = self.load()
+        self.resumed = _data is not None
+        self.data = _data if _data is not None else self.create()
+
+    def create(self) -> Dict:
+
+        return {'version': CHECKPOINT_VERSION, 'fingerprint': self.fingerprint, 'dates': None, 'objects': {}}
+
+    def load(self) -> Optional[Dict]:
+
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path) as file:
+                _data = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read checkpoint {self.path}. The run will start from the beginning.\n{e}")
+            return None
+
+        if _data.get('version') != CHECKPOINT_VERSION or _data.get('fingerprint') != self.fingerprint:
+            logging.warning("Configuration changed since the checkpoint was saved. "
+                            "The run will start from the beginning.")
+            return None
+
+        return _data
+
+    def discard(self):
+
+        with self.lock:
+            self.data = self.create()
+            self.resumed = False
+
+    def get(self, obj: str) -> Dict:
+
+        with self.lock:
+            return dict(self.data['objects'].get(obj, {}))
+
+    def get_objects(self) -> Dict[str, Dict]:
+
+        with self.lock:
+            return {obj: dict(record) for obj, record in self.data['objects'].items()}
+
+    def get_dates(self) -> Optional[Dict]:
+
+        return self.data['dates']
+
+    def set_dates(self, dates: Dict):
+
+        with self.lock:
+            self.data['dates'] = dates
+
+    def commit(self, obj: str, position: Dict, tables: Dict[str, int], items: Dict = None, **values):
+        """
+        Records the position of an object and sizes of its tables after a page was written. Items are added
+        to the items already recorded for the object. The checkpoint is saved, if the last save is older than
+        the interval.
+        """
+
+        with self.lock:
+            _record = self.data['objects'].setdefault(obj, {})
+            _record.update(values, position=dict(position), tables=dict(tables))
+
+            if items:
+                _record.setdefault('items', {}).update(items)
+
+            if time.monotonic() - self.saved >= self.interval:
+                self._save()
+
+    def complete(self, obj: str, tables: Dict[str, int], items: Dict = None, **values):
+
+        with self.lock:
+            _record = self.data['objects'].setdefault(obj, {})
+            _record.update(values, tables=dict(tables), done=True)
+            _record.pop('position', None)
+
+            if items:
+                _record.setdefault('items', {}).update(items)
+
+            self._save()
+
+    def save(self):
+
+        with self.lock:
+            self._save()
+
+    def remove(self):
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _save(self):
+
+        # the checkpoint is replaced atomically, so a crash while saving keeps the previous checkpoint
+        _path_tmp = self.path + '.tmp'
+
+        with open(_path_tmp, 'w') as file:
+            json.dump(self.data, file)
+
+        os.replace(_path_tmp, self.path)
+        self.saved = time.monotonic()
@@ -1,32 +1,47 @@
+import datetime
 import logging
+import random
 import re
-from retry import retry
+import requests
+import time
+from contextlib import closing
+from email.utils import parsedate_to_datetime
+from itertools import count
 from urllib.parse import urljoin
-from typing import Dict, List
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 from keboola.http_client import HttpClient
-from liveagent.utils import Parameters
+from requests.adapters import HTTPAdapter
+from liveagent import codec
+from liveagent.metrics import RunMetrics
+from liveagent.endpoints import DATE_FILTER_FIELD_CHATS, LIMIT_SIZE, PAGE_LIMIT, RATE_LIMIT, PAGINATION_OFFSET, \
+    PAGINATION_KEYSET, KEYSET_FIELD, KEYSET_ID_FIELD, KEYSET_SORT, CHANNEL_TYPES, ENDPOINTS
+from liveagent.ratelimit import RateLimiter
+from liveagent.utils import ClientException, Parameters, ordered_map
 
 LADESK_URL_REGEXP = r'[\w\.]*ladesk.com[/(api)(v3)]*'
 LADESK_URL = 'https://{}.ladesk.com/api/'
 
-PAGE_LIMIT = 500
-DATE_FILTER_FIELD_CALLS = 'dateCreated'
-DATE_FILTER_FIELD_CHATS = 'date_created'
-DATE_FILTER_FIELD_COMPS = 'datechanged'
-DATE_FILTER_FIELD_CONTS = 'datechanged'
-DATE_FILTER_FIELD_TCKTS = 'date_changed'
-DATE_FILTER_FIELD_MESGS = 'datecreated'
-DATE_FILTER_FIELD_HSTRY = 'date_from'
+PAGE_RETRIES = 5
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 60.0
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+THROTTLE_RETRIES = 20
+POOL_SIZE = 10
+# pools are kept per host, the API is served from a single host
+POOL_HOSTS = 4
 
-
-class ClientException(Exception):
-    pass
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_SHARD_MIN_SECONDS = 3600
+# ticket filters compare dates only, windows shorter than a day would return the same rows
+DATE_SHARD_MIN_SECONDS_TCKTS = 86400
 
 
 class LiveAgentClient(HttpClient):
 
     def __init__(self, token_v3: str, token_v1: str, organization: str, date_from: str, date_until: str,
-                 fail_on_error: bool = True):
+                 fail_on_error: bool = True, prefetch_pages: int = 1, rate_limit: float = RATE_LIMIT,
+                 metrics: RunMetrics = None, date_shards: int = 1, pool_size: int = POOL_SIZE,
+                 conversations_pagination: str = PAGINATION_OFFSET, channel_lanes: bool = False):
 
         self.parameters = Parameters()
         self.parameters.token_v3 = token_v3
@@ -35,13 +50,86 @@ class LiveAgentClient(HttpClient):
         self.parameters.date_from = date_from
         self.parameters.date_until = date_until
         self.parameters.fail_on_error = fail_on_error
+        self.parameters.prefetch_pages = prefetch_pages
+        self.parameters.rate_limit = rate_limit
+        self.parameters.date_shards = date_shards
+        self.parameters.pool_size = pool_size
+        self.parameters.conversations_pagination = conversations_pagination
+        self.parameters.channel_lanes = channel_lanes
+
+        # API v3 and API v1 use different API keys, each with its own request budget
+        _max_rate = rate_limit / 60 if rate_limit else None
+        self.limiters = {
+            'v3': RateLimiter(_max_rate),
+            'v1': RateLimiter(_max_rate)
+        }
+
+        self.metrics = metrics if metrics is not None else RunMetrics()
+        # endpoints, whose pagination was ended early by an error, which was only logged with fail_on_error off
+        self.incomplete = set()
 
         self.check_organization()
         super().__init__(base_url=self.parameters.url, auth_header={
             'apikey': self.parameters.token_v3,
             'accept': 'application/json',
             'content-type': 'application/json'
-        }, status_forcelist=(502, 504), max_retries=3)
+        }, status_forcelist=(), max_retries=0)
+
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        """
+        Session shared by all threads and both API versions. Connections are kept alive in a pool sized to the number
+        of parallel requests and responses are requested compressed; retries are handled per page in _get_page.
+        """
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=self.parameters.pool_size, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+        return session
+
+    def _request_raw(self, method: str, endpoint_path: str = None, **kwargs) -> requests.Response:
+        """
+        Same as HttpClient._request_raw, except requests are sent through the shared session, instead of a new session
+        (and hence a new connection) for every request.
+        """
+
+        url = self._build_url(endpoint_path, kwargs.pop('is_absolute_path', False))
+        headers = kwargs.pop('headers', None) or {}
+        headers.update(self._default_header)
+
+        if kwargs.pop('ignore_auth', False) is False:
+            headers.update(self._auth_header)
+            kwargs['auth'] = self._auth
+
+        if self._default_params and type(self._default_params) is dict:
+            kwargs['params'] = {**self._default_params, **(kwargs.pop('params', {}) or {})}
+
+        return self.session.request(method, url, headers=headers, **kwargs)
+
+    def get_pool_stats(self) -> Tuple[int, int]:
+        """
+        Returns the number of opened connections and the number of requests sent over them.
+        """
+
+        _connections = _requests = 0
+        _pools = self.session.get_adapter(self.base_url).poolmanager.pools
+
+        for key in _pools.keys():
+            _pool = _pools.get(key)
+
+            if _pool is not None:
+                _connections += _pool.num_connections
+                _requests += _pool.num_requests
+
+        return _connections, _requests
+
+    def close(self):
+
+        self.session.close()
 
     def check_organization(self):
 
@@ -56,75 +144,58 @@ class LiveAgentClient(HttpClient):
             self.parameters.url = LADESK_URL.format(str(self.parameters.organization))
             logging.debug(f"Organization URL: {self.parameters.url}.")
 
-    def get_agents(self) -> List:
+    def get_agents(self, position: Dict = None) -> Iterator[List]:
 
-        return self._get_paged_request('v3/agents')
+        return self._get_endpoint_request('agents', position=position)
 
-    def get_calls(self) -> List:
+    def get_calls(self, date_from: str = None, position: Dict = None) -> Iterator[List]:
 
-        par_calls = {
-            '_filters': self._create_filter_expresssion(DATE_FILTER_FIELD_CALLS)
-        }
+        return self._get_sharded_request('calls', self._create_filter_expresssion, date_from, position=position)
 
-        return self._get_paged_request('v3/calls', parameters=par_calls, method='cursor')
-
-    def get_chats(self) -> List:
+    def get_chats(self, date_from: str = None) -> Iterator[List]:
 
         par_chats = {
-            '_filters': self._create_filter_expresssion(DATE_FILTER_FIELD_CHATS)
+            '_filters': self._create_filter_expresssion(DATE_FILTER_FIELD_CHATS, date_from)
         }
 
         return self._get_paged_request('v3/chats', parameters=par_chats)
 
-    def get_companies(self) -> List:
-
-        par_companies = {
-            '_filters': self._create_filter_expresssion(DATE_FILTER_FIELD_COMPS)
-        }
-
-        return self._get_paged_request('v3/companies', parameters=par_companies)
-
-    def get_contacts(self) -> List:
+    def get_companies(self, date_from: str = None, position: Dict = None) -> Iterator[List]:
 
-        par_contacts = {
-            '_filters': self._create_filter_expresssion(DATE_FILTER_FIELD_CONTS)
-        }
+        return self._get_sharded_request('companies', self._create_filter_expresssion, date_from, position=position)
 
-        return self._get_paged_request('v3/contacts', parameters=par_contacts)
+    def get_contacts(self, date_from: str = None, position: Dict = None) -> Iterator[List]:
 
-    def get_departments(self) -> List:
+        return self._get_sharded_request('contacts', self._create_filter_expresssion, date_from, position=position)
 
-        return self._get_paged_request('v3/departments')
+    def get_departments(self, position: Dict = None) -> Iterator[List]:
 
-    def get_tags(self) -> List:
+        return self._get_endpoint_request('departments', position=position)
 
-        return self._get_paged_request('v3/tags')
+    def get_tags(self, position: Dict = None) -> Iterator[List]:
 
-    def get_tickets(self) -> List:
+        return self._get_endpoint_request('tags', position=position)
 
-        par_tickets = {
-            '_filters': self._create_filter_expression_tickets_v3(DATE_FILTER_FIELD_TCKTS)
-        }
+    def get_tickets(self, date_from: str = None, position: Dict = None) -> Iterator[List]:
 
-        return self._get_paged_request('v3/tickets', parameters=par_tickets)
+        return self._get_sharded_request('tickets', self._create_filter_expression_tickets_v3, date_from,
+                                         min_span=DATE_SHARD_MIN_SECONDS_TCKTS, position=position)
 
-    def get_ticket_messages(self, ticket_id: str) -> List:
+    def get_ticket_messages(self, ticket_id: str, date_from: str = None, position: Dict = None) -> Iterator[List]:
 
         par_messages = {
-            '_filters': self._create_filter_expresssion(DATE_FILTER_FIELD_MESGS)
+            '_filters': self._create_filter_expresssion(ENDPOINTS['tickets_messages'].filter_field, date_from)
         }
 
-        return self._get_paged_request(f'v3/tickets/{ticket_id}/messages', parameters=par_messages)
+        return self._get_endpoint_request('tickets_messages', parameters=par_messages, position=position,
+                                          id=ticket_id)
 
-    def get_tickets_history(self) -> List:
+    def get_tickets_history(self, date_from: str = None, position: Dict = None) -> Iterator[List]:
 
-        par_tickets_history = {
-            "_filters": self._create_filter_expresssion(DATE_FILTER_FIELD_HSTRY)
-        }
+        return self._get_sharded_request('tickets_history', self._create_filter_expresssion, date_from,
+                                         position=position)
 
-        return self._get_paged_request('v3/tickets/history', parameters=par_tickets_history, method='cursor')
-
-    def get_agent_report(self, date_from: str, date_to: str) -> List:
+    def get_agent_report(self, date_from: str, date_to: str, position: Dict = None) -> Iterator[List]:
 
         columns = 'id,contactid,firstname,lastname,worktime,answers,answers_ph,newAnswerAvgTime,' + \
                   'newAnswerAvgTimeSla,nextAnswerAvgTime,nextAnswerAvgTimeSla,calls,calls_ph,missed_calls,' + \
@@ -145,10 +216,9 @@ class LiveAgentClient(HttpClient):
             'columns': columns
         }
 
-        return self._get_paged_request('reports/agents', parameters=par_agent_report,
-                                       method='limit', result_key='agents')
+        return self._get_endpoint_request('agent_report', parameters=par_agent_report, position=position)
 
-    def get_ranking_agents_report(self, date_from: str, date_to: str) -> List:
+    def get_ranking_agents_report(self, date_from: str, date_to: str, position: Dict = None) -> Iterator[List]:
 
         columns = 'id,rankingType,datecreated,conversationid,agentcontactid,agentEmail,agent,contactid,' + \
                   'requesterEmail,requester,comment'
@@ -160,10 +230,10 @@ class LiveAgentClient(HttpClient):
             'columns': columns
         }
 
-        return self._get_paged_request('reports/ranking', parameters=par_ranking_agents_report,
-                                       method='limit', result_key='ranks')
+        return self._get_endpoint_request('ranking_agents_report', parameters=par_ranking_agents_report,
+                                          position=position)
 
-    def get_agent_availability_tickets(self, date_from: str, date_to: str) -> List:
+    def get_agent_availability_tickets(self, date_from: str, date_to: str, position: Dict = None) -> Iterator[List]:
 
         columns = 'id,userid,firstname,lastname,contactid,departmentid,department_name,hours_online,from_date,to_date'
 
@@ -174,10 +244,9 @@ class LiveAgentClient(HttpClient):
             'columns': columns
         }
 
-        return self._get_paged_request('reports/tickets/agentsavailability', result_key='agentsavailability',
-                                       parameters=par_agent_availability, method='limit')
+        return self._get_endpoint_request('agent_availability', parameters=par_agent_availability, position=position)
 
-    def get_agent_availability_chats(self, date_from: str, date_to: str) -> List:
+    def get_agent_availability_chats(self, date_from: str, date_to: str, position: Dict = None) -> Iterator[List]:
 
         columns = 'id,userid,firstname,lastname,contactid,departmentid,department_name,hours_online,from_date,to_date'
 
@@ -188,10 +257,10 @@ class LiveAgentClient(HttpClient):
             'columns': columns
         }
 
-        return self._get_paged_request('reports/chats/agentsavailability', result_key='agentsavailability',
-                                       parameters=par_agent_availability, method='limit')
+        return self._get_endpoint_request('agent_availability_chats', parameters=par_agent_availability,
+                                          position=position)
 
-    def get_calls_availability(self, date_from: str, date_to: str) -> List:
+    def get_calls_availability(self, date_from: str, date_to: str, position: Dict = None) -> Iterator[List]:
 
         par_calls_availability = {
             'date_from': date_from,
@@ -199,152 +268,545 @@ class LiveAgentClient(HttpClient):
             'apikey': self.parameters.token_v1
         }
 
-        return self._get_paged_request('reports/calls/availability', result_key='availability',
-                                       parameters=par_calls_availability, method='limit')
+        return self._get_endpoint_request('calls_availability', parameters=par_calls_availability, position=position)
 
-    def get_conversations(self, date_from: str) -> List:
+    def get_conversations(self, date_from: str, position: Dict = None) -> Iterator[List]:
 
         par_conversations = {
-            'datechanged': f'gt:{date_from}',
+            ENDPOINTS['conversations'].filter_field: f'gt:{date_from}',
             'apikey': self.parameters.token_v1,
-            'channel_type': 'E,B,M,I,C,W,F,A,T,Q,S'
+            'channel_type': ','.join(CHANNEL_TYPES)
         }
 
         logging.debug(f"Conversations parameters: {par_conversations}")
 
-        return self._get_paged_request('conversations', result_key='conversations',
-                                       parameters=par_conversations, method='limit',
-                                       limit_param='limit', offset_param='offset')
+        if self.parameters.conversations_pagination != PAGINATION_KEYSET:
+            return self._get_endpoint_request('conversations', parameters=par_conversations, stream=True,
+                                              position=position)
+
+        if not self.parameters.channel_lanes:
+            return self._get_endpoint_request('conversations', parameters={**par_conversations, **KEYSET_SORT},
+                                              method='keyset', position=position)
+
+        return self._get_channel_lanes({**par_conversations, **KEYSET_SORT}, position)
+
+    def _get_channel_lanes(self, parameters: Dict, position: Dict = None) -> Iterator[List]:
+        """
+        Downloads conversations of every channel type in its own lane with keyset pagination. Lanes are downloaded
+        in rounds, in every round the next page of every open lane is downloaded in parallel. The position of every
+        lane is stored in position under its channel type, when a page of the lane is yielded.
+        """
+
+        position = {} if position is None else position
+        _positions = {channel: dict(position.get(channel, {})) for channel in CHANNEL_TYPES}
+
+        def _get_lane(lane: Tuple[str, Iterator[List]]) -> Tuple[List, Dict]:
+
+            channel, pages = lane
+            return next(pages, None), dict(_positions[channel])
+
+        lanes = [(channel, iter(self._get_endpoint_request(
+            'conversations', parameters={**parameters, 'channel_type': channel}, method='keyset',
+            position=_positions[channel]))) for channel in CHANNEL_TYPES if not _positions[channel].get('complete')]
+
+        while lanes:
+
+            open_lanes = []
+
+            for (channel, pages), result, exc in ordered_map(_get_lane, lanes, len(lanes)):
 
-    def _create_filter_expresssion(self, filter_field):
+                if exc is not None:
+                    raise exc
 
-        _expr = f"[[\"{filter_field}\",\">=\",\"{self.parameters.date_from}\"]," + \
-                f"[\"{filter_field}\",\"<=\",\"{self.parameters.date_until}\"]]"
+                page, position[channel] = result
+
+                if page is not None:
+                    open_lanes += [(channel, pages)]
+                    yield page
+
+            lanes = open_lanes
+
+    def _create_filter_expresssion(self, filter_field, date_from=None, date_until=None):
+
+        date_from = self.parameters.date_from if date_from is None else date_from
+        date_until = self.parameters.date_until if date_until is None else date_until
+        _expr = f"[[\"{filter_field}\",\">=\",\"{date_from}\"]," + \
+                f"[\"{filter_field}\",\"<=\",\"{date_until}\"]]"
 
         # logging.debug(f"Expression: {_expr}.")
 
         return _expr
 
-    def _create_filter_expression_tickets_v3(self, filter_field):
+    def _create_filter_expression_tickets_v3(self, filter_field, date_from=None, date_until=None):
 
-        _expr = f"[[\"{filter_field}\",\"D>=\",\"{self.parameters.date_from}\"]," + \
-                f"[\"{filter_field}\",\"D<=\",\"{self.parameters.date_until}\"]]"
+        date_from = self.parameters.date_from if date_from is None else date_from
+        date_until = self.parameters.date_until if date_until is None else date_until
+        _expr = f"[[\"{filter_field}\",\"D>=\",\"{date_from}\"]," + \
+                f"[\"{filter_field}\",\"D<=\",\"{date_until}\"]]"
 
         logging.debug(f"Expression: {_expr}.")
 
         return _expr
 
-    @retry(Exception, tries=3, delay=2)
-    def _get_paged_request(self, endpoint: str, parameters: Dict = None,
-                           result_key: str = None, method: str = 'page', limit_size: int = 1000,
-                           limit_param: str = 'limitcount', offset_param: str = 'limitfrom') -> List:
+    def _get_endpoint_request(self, name: str, parameters: Dict = None, method: str = None, stream: bool = False,
+                              position: Dict = None, **path_args) -> Iterator[List]:
+        """
+        Generator over pages of an object of the registry. Path arguments fill placeholders of the path, requests
+        are labelled by the path without them. Method overrides the pagination of the endpoint.
+        """
 
-        url_endpoint = urljoin(self.base_url, endpoint)
+        endpoint = ENDPOINTS[name]
 
-        if method == 'page':
+        return self._get_paged_request(endpoint.path.format(**path_args), parameters=parameters,
+                                       result_key=endpoint.result_key,
+                                       method=endpoint.method if method is None else method,
+                                       limit_param=endpoint.limit_param, offset_param=endpoint.offset_param,
+                                       label=endpoint.path, stream=stream, position=position)
 
-            if parameters is None:
-                parameters = {}
-            par_endpoint = {**parameters, **{'_perPage': PAGE_LIMIT}}
+    def _get_sharded_request(self, name: str, create_filter: Callable[..., str], date_from: str = None,
+                             min_span: int = DATE_SHARD_MIN_SECONDS, position: Dict = None) -> Iterator[List]:
+        """
+        Downloads an object of the registry filtered by date in its filter field. With date_shards above 1, the date
+        range is split into date_shards windows, which are downloaded in parallel, each with its own filter and
+        pagination.
 
-            results = []
-            results_complete = False
-            _page = 0
+        Windows are downloaded in rounds, in every round the next page of every open window is downloaded, so at most
+        a single page per window is held in memory. Windows with a full first page are dense. If fewer windows than
+        workers returned a full page, dense windows are bisected after their first page and both halves are downloaded
+        in the next round, until windows are shorter than 2 * min_span. Positions are recorded only without windows,
+        a checkpointed request split to windows starts from the beginning.
 
-            while not results_complete:
+        Filters include both bounds, so rows dated (in the watermark field) on a bound between two windows are returned
+        by both of them and are deduplicated by their id. Only ids of such rows and of rows on the first page
+        of a bisected window, which its halves download again, are kept.
+        """
 
-                _page += 1
-                par_page = {**par_endpoint, **{'_page': _page}}
+        date_from = self.parameters.date_from if date_from is None else date_from
+        filter_field = ENDPOINTS[name].filter_field
+        date_field = ENDPOINTS[name].watermark_field
 
-                rsp_page = self.get_raw(endpoint_path=url_endpoint, params=par_page, is_absolute_path=True)
+        if self.parameters.date_shards <= 1:
+            par_endpoint = {'_filters': create_filter(filter_field, date_from)}
+            yield from self._get_endpoint_request(name, parameters=par_endpoint, position=position)
+            return
 
-                if rsp_page.status_code == 200:
+        def _get_window(task: Tuple[Tuple[str, str], Iterator[List]]) -> Tuple[List, Iterator[List]]:
+
+            window, pages = task
+
+            if pages is None:
+                par_window = {'_filters': create_filter(filter_field, *window)}
+                pages = iter(self._get_endpoint_request(name, parameters=par_window))
+
+            return next(pages, None), pages
+
+        # ticket filters compare dates only, so rows of the whole day of a bound are returned by both windows
+        _precision = 10 if min_span >= DATE_SHARD_MIN_SECONDS_TCKTS else 19
+
+        def _on_bound(row: Dict) -> bool:
+
+            _date = row.get(date_field)
+            return not isinstance(_date, str) or _date[:_precision] in bounds
+
+        windows = self._split_window(date_from, self.parameters.date_until, self.parameters.date_shards, min_span)
+        bounds = {window_from[:_precision] for window_from, _ in windows[1:]}
+        tasks = [(window, None) for window in windows]
+        seen_ids = set()
+
+        while tasks:
+
+            open_windows = []
+            full_windows = 0
+
+            for (window, started), result, exc in ordered_map(_get_window, tasks, self.parameters.date_shards):
+
+                if exc is not None:
+                    raise exc
 
-                    if result_key is None:
-                        res_page = rsp_page.json()
+                page, pages = result
 
-                    else:
-                        try:
-                            res_page = rsp_page.json()[result_key]
-                        except KeyError:
-                            raise ClientException(f"Key {result_key} not found in response.")
+                if page is None:
+                    continue
 
-                    results += res_page
+                res_page = [row for row in page if row.get('id') is None or row['id'] not in seen_ids]
+                seen_ids.update(row['id'] for row in res_page if row.get('id') is not None and _on_bound(row))
 
-                    if len(res_page) < PAGE_LIMIT:
-                        return results
+                if res_page:
+                    yield res_page
+
+                _dense = started is None and len(page) >= PAGE_LIMIT
+                full_windows += len(page) >= PAGE_LIMIT
+                open_windows += [(window, pages, page if _dense else None)]
+
+            # windows with a shorter page are about to finish, their workers are free for halves of dense windows
+            _bisect = full_windows < self.parameters.date_shards
+            tasks = []
+
+            for window, pages, first_page in open_windows:
+
+                if _bisect and first_page is not None and self._get_span(*window) >= 2 * min_span:
+                    pages.close()
+                    halves = self._split_window(*window, 2, min_span)
+                    bounds.update(half_from[:_precision] for half_from, _ in halves[1:])
+                    seen_ids.update(row['id'] for row in first_page if row.get('id') is not None)
+                    tasks += [(half, None) for half in halves]
 
                 else:
-                    return self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n "
-                                             f"Received: {rsp_page.status_code} - {rsp_page.text}.", results)
+                    tasks += [(window, pages)]
 
-        elif method == 'cursor':
-            results = []
-            results_complete = False
-            _cursor = None
+    @staticmethod
+    def _get_span(date_from: str, date_until: str) -> float:
 
-            while not results_complete:
+        try:
+            return (datetime.datetime.strptime(date_until[:19], DATE_FORMAT)
+                    - datetime.datetime.strptime(date_from[:19], DATE_FORMAT)).total_seconds()
+        except ValueError:
+            return 0
 
-                par_page = {**parameters, **{'_cursor': _cursor, '_perPage': PAGE_LIMIT}}
-                rsp_page = self.get_raw(endpoint_path=url_endpoint, params=par_page, is_absolute_path=True)
+    @classmethod
+    def _split_window(cls, date_from: str, date_until: str, shards: int, min_span: int) -> List[Tuple[str, str]]:
 
-                if rsp_page.status_code == 200:
+        _span = cls._get_span(date_from, date_until)
+        shards = int(min(shards, _span // min_span))
+
+        if shards <= 1:
+            return [(date_from, date_until)]
+
+        _start = datetime.datetime.strptime(date_from[:19], DATE_FORMAT)
+        _bounds = [(_start + datetime.timedelta(seconds=int(_span * idx / shards))).strftime(DATE_FORMAT)
+                   for idx in range(1, shards)]
+
+        return list(zip([date_from] + _bounds, _bounds + [date_until]))
+
+    def _get_paged_request(self, endpoint: str, parameters: Dict = None,
+                           result_key: str = None, method: str = 'page', limit_size: int = LIMIT_SIZE,
+                           limit_param: str = 'limitcount', offset_param: str = 'limitfrom',
+                           label: str = None, stream: bool = False, position: Dict = None) -> Iterator[List]:
+        """
+        Generator over pages of a paginated endpoint. Each page is yielded as soon as it is downloaded, so the caller
+        never holds more than a single page in memory. Label groups requests to parametrized endpoints in statistics.
+        With stream set, result arrays of v1 endpoints are parsed incrementally from the response.
+
+        If position is provided, pagination starts at the page, cursor or offset stored in it and the position
+        of the following page is stored in it before every page is yielded.
+
+        Keyset pagination filters every page by the keyset of the last row of the previous page, see _next_keyset_page.
+        """
+
+        url_endpoint = urljoin(self.base_url, endpoint)
+        label = endpoint if label is None else label
+        position = {} if position is None else position
+
+        if parameters is None:
+            parameters = {}
+
+        if method == 'page':
 
-                    if result_key is None:
-                        res_page = rsp_page.json()
+            _first = position.get('page', 1)
+            par_endpoint = {**parameters, **{'_perPage': PAGE_LIMIT}}
+            par_pages = ({**par_endpoint, **{'_page': _page}} for _page in count(_first))
+
+            yield from self._track_position(
+                self._get_numbered_pages(endpoint, label, url_endpoint, par_pages, PAGE_LIMIT,
+                                         lambda js_page: self._parse_page(js_page, result_key)),
+                position, 'page', _first, 1)
+
+        elif method == 'cursor':
+
+            if position.get('complete'):
+                return
 
-                    else:
-                        try:
-                            res_page = rsp_page.json()[result_key]
+            _cursor = position.get('cursor')
 
-                        except KeyError:
-                            raise ClientException(f"Key {result_key} not found in response.")
+            while True:
 
-                    results += res_page
+                par_page = {**parameters, **{'_cursor': _cursor, '_perPage': PAGE_LIMIT}}
+                rsp_page, js_page = self._get_page(label, url_endpoint, par_page)
+
+                if rsp_page.status_code == 200:
 
+                    res_page = self._parse_page(js_page, result_key)
                     _cursor = rsp_page.headers.get('next_page_cursor', None)
-                    if _cursor is None:
-                        return results
+                    position.update({'cursor': _cursor, 'complete': _cursor is None})
+
+                    yield res_page
 
-                    else:
-                        continue
+                    if _cursor is None:
+                        return
 
                 else:
-                    return self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
-                                             f"Received: {rsp_page.status_code} - {rsp_page.text}.", results)
+                    self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
+                                      f"Received: {rsp_page.status_code} - {rsp_page.text}.", endpoint)
+                    return
 
         elif method == 'limit':
-            results = []
-            results_complete = False
-            limit = limit_size
-            offset = 0
 
-            while not results_complete:
+            _first = position.get('offset', 0)
+            par_pages = ({**parameters, **{limit_param: limit_size, offset_param: offset}}
+                         for offset in count(_first, limit_size))
 
-                par_page = {**parameters, **{limit_param: limit, offset_param: offset}}
-                rsp_page = self.get_raw(endpoint_path=url_endpoint, params=par_page, is_absolute_path=True)
+            yield from self._track_position(
+                self._get_numbered_pages(endpoint, label, url_endpoint, par_pages, limit_size,
+                                         lambda js_page: js_page['response'][result_key],
+                                         f'response.{result_key}' if stream and codec.STREAMING else None),
+                position, 'offset', _first, limit_size)
 
-                if rsp_page.status_code == 200:
+        elif method == 'keyset':
 
-                    _js = rsp_page.json()
-                    _res = _js['response'][result_key]
+            while not position.get('complete'):
 
-                    results += _res
+                par_page = self._get_keyset_parameters(parameters, position, limit_size, limit_param, offset_param)
+                rsp_page, js_page = self._get_page(label, url_endpoint, par_page)
 
-                    if len(_res) < limit:
-                        return results
+                if rsp_page.status_code != 200:
+                    self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
+                                      f"Received: {rsp_page.status_code} - {rsp_page.text}.", endpoint)
+                    return
 
-                    else:
-                        offset += limit
+                res_page = self._next_keyset_page(js_page['response'][result_key], position, limit_size)
+
+                if res_page:
+                    yield res_page
 
-                else:
-                    return self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
-                                             f"Received: {rsp_page.status_code} - {rsp_page.text}.", results)
         else:
             raise ClientException(f"Unsupported pagination method {method}.")
 
-    def handle_error(self, msg: str, results: list):
+    @staticmethod
+    def _get_keyset_parameters(parameters: Dict, position: Dict, limit_size: int, limit_param: str,
+                               offset_param: str) -> Dict:
+
+        _watermark = position.get('watermark')
+        par_page = {**parameters, **{limit_param: limit_size, offset_param: position.get('skip', 0)}}
+
+        # the filter compares whole seconds, rows changed in the second of the watermark are requested again
+        # and the ones already downloaded are skipped by their id
+        if _watermark is not None:
+            _from = datetime.datetime.strptime(_watermark, DATE_FORMAT) - datetime.timedelta(seconds=1)
+            par_page[KEYSET_FIELD] = f'gt:{_from.strftime(DATE_FORMAT)}'
+
+        return par_page
+
+    @staticmethod
+    def _next_keyset_page(page: List[Dict], position: Dict, limit_size: int) -> List[Dict]:
+        """
+        Returns rows of the page, which were not downloaded yet, and moves the position to the keyset of the last row:
+        the watermark (datechanged) and ids of rows changed at the watermark. If a full page does not move
+        the watermark, more rows than the size of a page changed in the same second and the following page skips them
+        by its offset instead.
+
+        The keyset relies on the API filtering and sorting rows by datechanged. A page, which is not sorted
+        or contains rows changed before the watermark, raises ClientException rather than skipping rows silently.
+        Rows without datechanged are always returned, they do not move the watermark.
+        """
+
+        _watermark = position.get('watermark')
+        _ids = set(position.get('ids', []))
+        _dates = ([_watermark] if _watermark else []) + [row[KEYSET_FIELD] for row in page if row.get(KEYSET_FIELD)]
+
+        if any(_prev > _date for _prev, _date in zip(_dates, _dates[1:])):
+            raise ClientException(f"Conversations returned by the API are not sorted by {KEYSET_FIELD}. Keyset "
+                                  f"pagination cannot be used, use offset pagination of conversations instead.")
+
+        res_page = [row for row in page if _watermark is None or not row.get(KEYSET_FIELD)
+                    or row[KEYSET_FIELD] > _watermark
+                    or (row[KEYSET_FIELD] == _watermark and row.get(KEYSET_ID_FIELD) not in _ids)]
+
+        _next = max([row[KEYSET_FIELD] for row in res_page if row.get(KEYSET_FIELD)] + [_watermark or ''])
+
+        if _next != _watermark:
+            _ids = set()
+
+        _ids.update(row[KEYSET_ID_FIELD] for row in res_page
+                    if row.get(KEYSET_FIELD) == _next and row.get(KEYSET_ID_FIELD) is not None)
+
+        position.update({'watermark': _next or None, 'ids': sorted(_ids), 'complete': len(page) < limit_size,
+                         'skip': position.get('skip', 0) + len(page) if _next == _watermark and page else 0})
+
+        return res_page
+
+    @staticmethod
+    def _track_position(pages: Iterator[List], position: Dict, key: str, first: int, step: int) -> Iterator[List]:
+
+        with closing(pages):
+            for _position, page in zip(count(first + step, step), pages):
+                position[key] = _position
+                yield page
+
+    def _get_numbered_pages(self, endpoint: str, label: str, url: str, page_parameters: Iterator[Dict],
+                            page_size: int, extract: Callable[[Any], List],
+                            stream_key: str = None) -> Iterator[List]:
+        """
+        Pagination for methods, where parameters of every page are known upfront. The first page is downloaded
+        on its own; if it is full, up to prefetch_pages following pages are kept in flight ahead of the consumer.
+        Pagination ends with the first short page and any pages prefetched past it are discarded.
+        """
+
+        page_parameters = iter(page_parameters)
+        _workers = 1
+
+        while True:
+
+            with closing(ordered_map(lambda par_page: self._get_page(label, url, par_page, stream_key),
+                                     page_parameters, _workers, _workers)) as pages:
+
+                for _, _page, _exc in pages:
+
+                    if _exc is not None:
+                        raise _exc
+
+                    rsp_page, js_page = _page
+
+                    if rsp_page.status_code != 200:
+                        self.handle_error(f"Could not download paginated data for endpoint {endpoint}.\n"
+                                          f"Received: {rsp_page.status_code} - {rsp_page.text}.", endpoint)
+                        return
+
+                    res_page = extract(js_page)
+                    yield res_page
+
+                    if len(res_page) < page_size:
+                        return
+
+                    elif _workers < self.parameters.prefetch_pages:
+                        _workers = self.parameters.prefetch_pages
+                        break
+
+    def _get_page(self, endpoint: str, url: str, parameters: Dict,
+                  stream_key: str = None) -> Tuple[requests.Response, Any]:
+        """
+        Downloads a single page. Connection errors, retryable status codes and malformed JSON bodies are retried
+        for this page only, with exponential backoff and jitter, so the pagination position is never lost.
+        Every request passes through the rate limiter of its API version; throttled (429) requests pause the limiter
+        for the duration of the Retry-After header and are retried separately from other errors.
+        Returns the response together with the decoded body, which is None for unsuccessful responses.
+        If stream_key is provided, the array at this dotted path is parsed incrementally from the response stream.
+        """
+
+        attempt = 0
+        throttled = 0
+        limiter = self._get_limiter(endpoint)
+
+        while True:
+
+            limiter.acquire()
+            _start = time.perf_counter()
+
+            try:
+                rsp = self.get_raw(endpoint_path=url, params=parameters, is_absolute_path=True, stream=bool(stream_key))
+                self.metrics.record_request(endpoint, time.perf_counter() - _start)
+
+                if rsp.status_code == 200:
+                    limiter.success()
+                    return rsp, self._decode_page(endpoint, rsp, stream_key)
+
+                elif rsp.status_code == 429 and throttled < THROTTLE_RETRIES:
+                    throttled += 1
+                    self.metrics.record_retry(endpoint)
+
+                    retry_after = self._get_retry_after(rsp, throttled)
+                    limiter.throttle(retry_after)
+                    logging.debug(f"Request to {endpoint} was throttled. Retrying in {retry_after:.1f} seconds "
+                                  f"with rate {limiter.rate * 60:.0f} requests per minute.")
+                    continue
+
+                elif rsp.status_code not in RETRY_STATUS_CODES or attempt >= PAGE_RETRIES:
+                    return rsp, None
+
+                reason = f"{rsp.status_code} - {rsp.text}"
+
+            except (requests.exceptions.RequestException, ValueError) as e:
+                if isinstance(e, requests.exceptions.RequestException):
+                    self.metrics.record_request(endpoint, time.perf_counter() - _start)
+
+                if attempt >= PAGE_RETRIES:
+                    raise ClientException(f"Could not download data for endpoint {endpoint} "
+                                          f"after {attempt} retries.\n{e}") from e
+
+                reason = str(e)
+
+            attempt += 1
+            self.metrics.record_retry(endpoint)
+
+            delay = self._get_backoff(attempt)
+            logging.debug(f"Retrying request to {endpoint} in {delay:.1f} seconds "
+                          f"(attempt {attempt}/{PAGE_RETRIES}). Reason: {reason}")
+            time.sleep(delay)
+
+    def _decode_page(self, endpoint: str, response: requests.Response, stream_key: str = None) -> Any:
+
+        _start = time.perf_counter()
+
+        if stream_key is None:
+            document = codec.loads(response.content)
+            self.metrics.record_page(endpoint, len(response.content), time.perf_counter() - _start,
+                                     response.raw.tell())
+            return document
+
+        response.raw.decode_content = True
+        document = _document = {}
+        *_path, _key = stream_key.split('.')
+
+        for key in _path:
+            _document[key] = {}
+            _document = _document[key]
+
+        _document[_key] = list(codec.iter_items(response.raw, stream_key))
+
+        # the rest of the body is drained, so the connection is released back to the pool
+        response.raw.read()
+        self.metrics.record_page(endpoint, response.raw.tell(), time.perf_counter() - _start)
+        return document
+
+    def _get_limiter(self, endpoint: str) -> RateLimiter:
+
+        return self.limiters['v3'] if endpoint.startswith('v3/') else self.limiters['v1']
+
+    def _get_retry_after(self, response: requests.Response, attempt: int) -> float:
+
+        _retry_after = response.headers.get('Retry-After')
+
+        if _retry_after is not None:
+            try:
+                return max(0.0, float(_retry_after))
+            except ValueError:
+                pass
+
+            try:
+                _retry_at = parsedate_to_datetime(_retry_after)
+                return max(0.0, (_retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+        return self._get_backoff(attempt)
+
+    @staticmethod
+    def _get_backoff(attempt: int) -> float:
+
+        _cap = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (attempt - 1))
+        return _cap / 2 + random.uniform(0, _cap / 2)
+
+    @staticmethod
+    def _parse_page(js_page: Any, result_key: str = None) -> List:
+
+        if result_key is None:
+            return js_page
+
+        try:
+            return js_page[result_key]
+        except KeyError:
+            raise ClientException(f"Key {result_key} not found in response.")
+
+    def handle_error(self, msg: str, endpoint: str = None):
         if self.parameters.fail_on_error:
             raise ClientException(msg)
         logging.warning(msg)
-        return results
+
+        if endpoint is not None:
+            self.incomplete.add(endpoint)
+
+    def is_complete(self, endpoint: str) -> bool:
+        """
+        Returns False, if pagination of the endpoint was ended early by an error, i.e. some of its pages are missing.
+        """
+
+        return endpoint not in self.incomplete
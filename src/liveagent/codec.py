@@ -0,0 +1,53 @@
+"""
+JSON decoding and encoding used for API responses and JSON columns. Responses are decoded with the fastest installed
+backend: orjson when available, the standard library otherwise. JSON columns are always encoded with the standard
+library defaults, which orjson cannot reproduce (spaces after separators, escaped non-ASCII characters), so
+the written tables do not change with the installed backend.
+
+Incremental parsing of large arrays is available when ijson is installed.
+"""
+import json
+from typing import Any, BinaryIO, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+STREAMING = ijson is not None
+
+
+def loads(data) -> Any:
+
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+
+    return json.dumps(obj)
+
+
+def iter_items(stream: BinaryIO, prefix: str) -> Iterator[Any]:
+    """
+    Yields items of the array located at the dotted prefix (e.g. "response.conversations") one by one,
+    without reading the whole document into memory. Falls back to full decoding if ijson is not installed.
+    """
+
+    if ijson is not None:
+        yield from ijson.items(stream, prefix + '.item', use_float=True)
+        return
+
+    document = loads(stream.read())
+    for key in prefix.split('.'):
+        document = document[key]
+
+    yield from document
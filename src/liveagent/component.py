@@ -1,9 +1,23 @@
-import dateparser
+import datetime
+import hashlib
 import logging
+import os
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from kbc.env_handler import KBCEnvHandler
-from liveagent.utils import Parameters
-from liveagent.client import LiveAgentClient, ClientException
-from liveagent.result import LiveAgentWriter
+from liveagent.utils import ClientException, Parameters, ordered_map, parse_date
+from liveagent import codec, result
+from liveagent.checkpoint import Checkpoint, CHECKPOINT_FILE
+from liveagent.endpoints import ENDPOINTS, API_V1, API_V3, ARGS_DAILY, ARGS_DATE_FROM, ARGS_DATE_RANGE, RATE_LIMIT, \
+    PAGINATIONS, PAGINATION_OFFSET, PAGINATION_KEYSET, CHANNEL_TYPES
+from liveagent.metrics import RunMetrics
+from liveagent.result import LiveAgentWriter, ContentStore, RowHashIndex, FORMAT_CSV, FORMAT_PARQUET, OUTPUT_FORMATS, \
+    SLICE_SIZE_MB
+
+# the HTTP client stack (requests, httpx) and the planner are imported only when a client is created
+if TYPE_CHECKING:
+    from liveagent.client import LiveAgentClient
 
 # configuration variables
 KEY_API_TOKEN = '#token'
@@ -16,15 +30,62 @@ KEY_DATE_UNTIL = 'until'
 KEY_INCREMENTAL = 'incremental_load'
 KEY_DEBUG = 'debug'
 KEY_FAIL_ON_ERROR = 'fail_on_error'
+KEY_MAX_WORKERS = 'max_workers'
+KEY_PREFETCH_PAGES = 'prefetch_pages'
+KEY_PARALLEL_OBJECTS = 'parallel_objects'
+KEY_RUN_METRICS = 'run_metrics'
+KEY_OUTPUT_FORMAT = 'output_format'
+KEY_SLICE_SIZE = 'slice_size_mb'
+KEY_CACHE_TTL = 'cache_ttl_hours'
+KEY_SKIP_UNCHANGED = 'skip_unchanged_rows'
+KEY_SKIP_INACTIVE_TICKETS = 'skip_inactive_tickets'
+KEY_RATE_LIMIT = 'rate_limit'
+KEY_DATE_SHARDS = 'date_shards'
+KEY_ENGINE = 'engine'
+KEY_MEMORY_BUDGET = 'memory_budget_mb'
+KEY_OFFLOAD_BODIES = 'offload_bodies_kb'
+KEY_CHECKPOINT_INTERVAL = 'checkpoint_interval_seconds'
+KEY_DRY_RUN = 'dry_run'
+KEY_CONVERSATIONS_PAGINATION = 'conversations_pagination'
+KEY_CHANNEL_LANES = 'conversations_channel_lanes'
+KEY_WATERMARK = 'incremental_watermark'
+KEY_WATERMARK_OVERLAP = 'watermark_overlap_minutes'
+
+# state variables
+STATE_WATERMARKS = 'watermarks'
+STATE_RESPONSE_CACHE = 'response_cache'
+STATE_ROW_HASHES = 'row_hashes'
+STATE_TICKET_ACTIVITY = 'ticket_activity'
 
 MANDATORY_PARS = [KEY_API_TOKEN, KEY_ORGANIZATION, KEY_OBJECTS]
 MANDATORY_IMAGE_PARS = []
 
 APP_VERSION = '0.2.1'
-SUPPORTED_ENDPOINTS = ["agents", "calls", "companies", "contacts", "departments", "tags", "tickets", "tickets_messages",
-                       "tickets_history"]
-SUPPORTED_ENDPOINTS_V1 = ["agent_report", "agent_availability", "conversations", "agent_availability_chats",
-                          "calls_availability", "ranking_agents_report"]
+SUPPORTED_ENDPOINTS = [name for name, endpoint in ENDPOINTS.items() if endpoint.version == API_V3]
+SUPPORTED_ENDPOINTS_V1 = [name for name, endpoint in ENDPOINTS.items() if endpoint.version == API_V1]
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+ENGINE_THREADS = 'threads'
+ENGINE_ASYNCIO = 'asyncio'
+ENGINES = [ENGINE_THREADS, ENGINE_ASYNCIO]
+
+# slowly changing dimensions, which can be served from the response cache
+CACHED_ENDPOINTS = {name: endpoint.path for name, endpoint in ENDPOINTS.items() if endpoint.cached}
+CACHE_MAX_AGE_DAYS = 30
+CACHE_MAX_ENTRIES = 100
+
+# tables, which are re-downloaded within the date range with mostly unchanged rows
+ROW_HASH_TABLES = ['companies', 'contacts', 'tickets']
+
+TICKET_ACTIVITY_FIELDS = ['last_activity', 'date_changed']
+TICKET_ACTIVITY_MAX_TICKETS = 200000
+
+# approximate size of a downloaded message without its bodies, used to estimate memory of pending tickets
+MESSAGE_SIZE = 1024
+
+WATERMARK_FIELDS = {name: endpoint.watermark_field for name, endpoint in ENDPOINTS.items()
+                    if endpoint.watermark_field is not None}
 
 
 class UserException(Exception):
@@ -56,21 +117,81 @@ class Component(KBCEnvHandler):
         self.parameters.date_object = self.cfg_params.get(KEY_DATE, {})
         self.parameters.incremental = self.cfg_params.get(bool(KEY_INCREMENTAL), True)
         self.parameters.fail_on_error = self.cfg_params.get(KEY_FAIL_ON_ERROR, False)
+        self.parameters.max_workers = self.check_integer(KEY_MAX_WORKERS)
+        self.parameters.prefetch_pages = self.check_integer(KEY_PREFETCH_PAGES)
+        self.parameters.parallel_objects = self.check_integer(KEY_PARALLEL_OBJECTS)
+        self.parameters.rate_limit = self.check_integer(KEY_RATE_LIMIT, default=RATE_LIMIT, minimum=0)
+        self.parameters.date_shards = self.check_integer(KEY_DATE_SHARDS)
+        self.parameters.engine = self.cfg_params.get(KEY_ENGINE, ENGINE_THREADS)
+        self.parameters.memory_budget = self.check_integer(KEY_MEMORY_BUDGET, default=256)
+        self.parameters.offload_bodies = self.check_integer(KEY_OFFLOAD_BODIES, default=0, minimum=0)
+        self.parameters.checkpoint_interval = self.check_integer(KEY_CHECKPOINT_INTERVAL, default=0, minimum=0)
+        self.parameters.dry_run = bool(self.cfg_params.get(KEY_DRY_RUN, False))
+        self.parameters.conversations_pagination = self.cfg_params.get(KEY_CONVERSATIONS_PAGINATION,
+                                                                       PAGINATION_OFFSET)
+        self.parameters.channel_lanes = bool(self.cfg_params.get(KEY_CHANNEL_LANES, False))
+        self.parameters.output_format = self.cfg_params.get(KEY_OUTPUT_FORMAT, FORMAT_CSV)
+        self.parameters.slice_size = self.check_integer(KEY_SLICE_SIZE, default=SLICE_SIZE_MB)
+        self.parameters.cache_ttl = self.check_integer(KEY_CACHE_TTL, default=0, minimum=0)
+        self.parameters.skip_unchanged = bool(self.cfg_params.get(KEY_SKIP_UNCHANGED, False))
+        self.parameters.skip_inactive_tickets = bool(self.cfg_params.get(KEY_SKIP_INACTIVE_TICKETS, False))
+        self.parameters.run_metrics = bool(self.cfg_params.get(KEY_RUN_METRICS, False))
+        self.parameters.watermark = bool(self.cfg_params.get(KEY_WATERMARK, False))
+        self.parameters.watermark_overlap = self.check_integer(KEY_WATERMARK_OVERLAP, default=60, minimum=0)
+
+        self.state = self.get_state_file()
+        if not isinstance(self.state, dict):
+            self.state = {}
+        self.watermarks = dict(self.state.get(STATE_WATERMARKS, {}))
+        self.response_cache = dict(self.state.get(STATE_RESPONSE_CACHE, {}))
+        self.row_hashes = {}
+        self.ticket_activity = dict(self.state.get(STATE_TICKET_ACTIVITY, {}))
 
         self.check_objects()
+        self.check_output_format()
+        self.check_engine()
+        self.check_pagination()
         self.parse_dates()
+        self.checkpoint = self.create_checkpoint()
+
+        self.metrics = RunMetrics()
+        self.client = self.create_client()
+
+    def create_client(self) -> 'LiveAgentClient':
+
+        if self.parameters.engine == ENGINE_ASYNCIO:
+            from liveagent.async_client import AsyncLiveAgentClient
+            _client_class = AsyncLiveAgentClient
+
+        else:
+            from liveagent.client import LiveAgentClient
+            _client_class = LiveAgentClient
 
-        self.client = LiveAgentClient(self.parameters.token, self.parameters.token_v1, self.parameters.organization,
-                                      self.parameters.date_from, self.parameters.date_until,
-                                      self.parameters.fail_on_error)
+        # the planner probes pages at given offsets, which are not supported for requests split to date windows
+        # or conversations paginated by keyset
+        _date_shards = 1 if self.parameters.dry_run else self.parameters.date_shards
+        _pagination = PAGINATION_OFFSET if self.parameters.dry_run else self.parameters.conversations_pagination
+
+        return _client_class(self.parameters.token, self.parameters.token_v1, self.parameters.organization,
+                             self.parameters.date_from, self.parameters.date_until,
+                             self.parameters.fail_on_error, self.parameters.prefetch_pages,
+                             self.parameters.rate_limit, self.metrics, _date_shards,
+                             self.get_pool_size(), _pagination, self.parameters.channel_lanes)
+
+    def get_pool_size(self) -> int:
+
+        # maximum number of requests in flight, every object downloaded in parallel uses one of the parallel modes
+        _requests = max(self.parameters.max_workers, self.parameters.prefetch_pages, self.parameters.date_shards,
+                        len(CHANNEL_TYPES) if self.parameters.channel_lanes else 1)
+        return _requests * self.parameters.parallel_objects
 
     def parse_dates(self):
 
         date_from = self.parameters.date_object.get(KEY_DATE_FROM, '30 days ago')
         date_until = self.parameters.date_object.get(KEY_DATE_UNTIL, 'now')
 
-        date_from_parsed = dateparser.parse(date_from)
-        date_until_parsed = dateparser.parse(date_until)
+        date_from_parsed = self.parse_date(date_from)
+        date_until_parsed = self.parse_date(date_until)
 
         if any([date_from_parsed is None, date_until_parsed is None]):
             raise UserException(
@@ -89,6 +210,74 @@ class Component(KBCEnvHandler):
             logging.debug(f"Date from: {self.parameters.date_from}.")
             logging.debug(f"Date until: {self.parameters.date_until}.")
 
+    @staticmethod
+    def parse_date(value: str) -> Optional[datetime.datetime]:
+
+        _parsed = parse_date(value)
+
+        if _parsed is not None:
+            return _parsed
+
+        # dateparser takes a long time to import, it is loaded only for dates in other formats than ISO and simple
+        # relative dates
+        import dateparser
+        return dateparser.parse(value)
+
+    def create_checkpoint(self) -> Optional[Checkpoint]:
+        """
+        Creates the checkpoint of the run, if checkpoints are enabled. A run resumed from a checkpoint uses the date
+        range of the run which saved it, so relative dates (e.g. 30 days ago) select the same data, and watermarks
+        of objects finished before the restart.
+
+        The checkpoint and the tables it refers to are kept in the data folder, so a new job with a fresh data folder
+        does not find them and starts from the beginning.
+        """
+
+        if self.parameters.checkpoint_interval == 0 or self.parameters.dry_run:
+            return None
+
+        if self.parameters.output_format != FORMAT_CSV:
+            raise UserException(f"Checkpoints are supported only with output format {FORMAT_CSV}.")
+
+        _fingerprint = hashlib.sha256(codec.dumps(self.cfg_params).encode('utf-8')).hexdigest()
+        _checkpoint = Checkpoint(os.path.join(self.data_path, CHECKPOINT_FILE), _fingerprint,
+                                 self.parameters.checkpoint_interval)
+
+        if _checkpoint.resumed and not self.check_checkpoint_tables(_checkpoint):
+            logging.warning("Tables written before the checkpoint was saved are missing. "
+                            "The run will start from the beginning.")
+            _checkpoint.discard()
+
+        if not _checkpoint.resumed:
+            _checkpoint.set_dates({'date_from': self.parameters.date_from, 'date_until': self.parameters.date_until,
+                                   'date_chunks': self.parameters.date_chunks})
+            return _checkpoint
+
+        _dates = _checkpoint.get_dates()
+        self.parameters.date_from = _dates['date_from']
+        self.parameters.date_until = _dates['date_until']
+        self.parameters.date_chunks = _dates['date_chunks']
+
+        _objects = _checkpoint.get_objects()
+        for obj, record in _objects.items():
+            if record.get('done') and record.get('watermark') is not None:
+                self.watermarks[obj] = record['watermark']
+
+        logging.info(f"Resuming the run from checkpoint. Finished objects: "
+                     f"{[obj for obj, record in _objects.items() if record.get('done')]}.")
+        return _checkpoint
+
+    def check_checkpoint_tables(self, checkpoint: Checkpoint) -> bool:
+
+        for record in checkpoint.get_objects().values():
+            for table, size in record.get('tables', {}).items():
+                _path = os.path.join(self.tables_out_path, f'{table}.csv')
+
+                if not os.path.isfile(_path) or os.path.getsize(_path) < size:
+                    return False
+
+        return True
+
     def check_objects(self):
 
         if not self.parameters.objects:
@@ -108,133 +297,594 @@ class Component(KBCEnvHandler):
             raise UserException(
                 f"Unsupported endpoints specified: {_unsupported}. Must be one of {SUPPORTED_ENDPOINTS}.")
 
+    def check_integer(self, key: str, default: int = 1, minimum: int = 1) -> int:
+
+        value = self.cfg_params.get(key, default)
+
+        try:
+            value_int = int(value)
+        except (TypeError, ValueError):
+            raise UserException(f"Parameter {key} must be an integer. Given: {value}.")
+
+        if value_int < minimum:
+            raise UserException(f"Parameter {key} must be at least {minimum}. Given: {value}.")
+
+        return value_int
+
+    def get_date_from(self, obj: str) -> str:
+        """
+        Returns the start of the download window for an object. With watermarks enabled, the window starts at the
+        latest value seen in the previous run minus the overlap, but never before the configured start date.
+        A resumed object keeps the start it was downloaded with before the restart.
+        """
+
+        _checkpoint_date_from = self.get_checkpoint(obj).get('date_from')
+
+        if _checkpoint_date_from is not None:
+            return _checkpoint_date_from
+
+        _watermark = self.watermarks.get(obj)
+
+        if not self.parameters.watermark or _watermark is None:
+            return self.parameters.date_from
+
+        try:
+            _watermark_dt = datetime.datetime.strptime(_watermark[:19], DATE_FORMAT)
+        except ValueError:
+            logging.warning(f"Could not parse watermark {_watermark} for {obj}. Using configured date range.")
+            return self.parameters.date_from
+
+        _overlap = datetime.timedelta(minutes=self.parameters.watermark_overlap)
+        _date_from = max((_watermark_dt - _overlap).strftime(DATE_FORMAT), self.parameters.date_from)
+
+        logging.info(f"Downloading {obj} data from watermark {_date_from}.")
+        return _date_from
+
+    def track_watermark(self, obj: str, pages: Iterator[List]) -> Iterator[List]:
+
+        _field = WATERMARK_FIELDS[obj]
+        _initial = self.watermarks.get(obj)
+        _watermark = self.get_checkpoint(obj).get('watermark', _initial)
+
+        for page in pages:
+            _values = [row[_field] for row in page if row.get(_field)]
+
+            if _values:
+                _watermark = max(max(_values), _watermark or '')
+
+            # the watermark is updated with every page, so it can be checkpointed together with the page
+            if _watermark is not None:
+                self.watermarks[obj] = _watermark
+
+            yield page
+
+        # pages are not ordered by the watermark field, rows after a missing page may be older than the watermark
+        if not self.client.is_complete(ENDPOINTS[obj].path):
+            logging.warning(f"Download of {obj} data was not complete. The watermark of {obj} is not moved.")
+            self.watermarks.pop(obj, None)
+
+            if _initial is not None:
+                self.watermarks[obj] = _initial
+
+    def check_output_format(self):
+
+        if self.parameters.output_format not in OUTPUT_FORMATS:
+            raise UserException(f"Unsupported output format {self.parameters.output_format}. "
+                                f"Must be one of {OUTPUT_FORMATS}.")
+
+        if self.parameters.output_format == FORMAT_PARQUET:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise UserException("Output format parquet requires package pyarrow, which is not installed. "
+                                    "Build the image with the build argument WITH_PARQUET=true.")
+
+    def check_engine(self):
+
+        if self.parameters.engine not in ENGINES:
+            raise UserException(f"Unsupported engine {self.parameters.engine}. Must be one of {ENGINES}.")
+
+        if self.parameters.engine == ENGINE_ASYNCIO:
+            try:
+                import httpx  # noqa: F401
+            except ImportError:
+                raise UserException("Engine asyncio requires package httpx, which is not installed.")
+
+    def check_pagination(self):
+
+        if self.parameters.conversations_pagination not in PAGINATIONS:
+            raise UserException(f"Unsupported pagination of conversations {self.parameters.conversations_pagination}. "
+                                f"Must be one of {PAGINATIONS}.")
+
+        if self.parameters.channel_lanes and self.parameters.conversations_pagination != PAGINATION_KEYSET:
+            raise UserException(f"Parallel lanes of conversations require pagination {PAGINATION_KEYSET}.")
+
     def run(self):
 
+        if self.parameters.dry_run:
+            return self.run_plan()
+
         _objects = self.parameters.objects
-        _incremental = self.parameters.incremental
 
         logging.info(f"Downloading data from {self.parameters.date_from} to {self.parameters.date_until}.")
 
+        # objects which depend on another object (e.g. messages on IDs of tickets) are downloaded in its task
+        _tasks = []
         for obj in _objects:
+            _task = ENDPOINTS[obj].depends_on or obj
+            if _task not in _tasks:
+                _tasks += [_task]
+
+        try:
+            for obj, _, _exc in ordered_map(self.download_object, _tasks, self.parameters.parallel_objects,
+                                            len(_tasks)):
+                if _exc is not None:
+                    if isinstance(_exc, ClientException):
+                        raise UserException(_exc) from _exc
+                    raise _exc
+
+        except Exception:
+            # positions committed since the last periodic save are kept for the next run
+            if self.checkpoint is not None:
+                self.checkpoint.save()
+            raise
+
+        self.metrics.record_pool(*self.client.get_pool_stats())
+        self.client.close()
+        self.metrics.log_summary()
+
+        if self.parameters.run_metrics:
+            self.write_run_metrics()
+
+        self.state[STATE_WATERMARKS] = self.watermarks
+        self.state[STATE_RESPONSE_CACHE] = self.evict_response_cache()
+        self.state[STATE_ROW_HASHES] = self.get_row_hashes_state()
+        self.state[STATE_TICKET_ACTIVITY] = self.get_ticket_activity_state()
+        self.write_state_file(self.state)
+
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+    def run_plan(self):
+        """
+        Estimates requests, rows and runtime of every object for the configured date range without downloading
+        the data. The estimates are logged and written to table run_plan, the state is kept as is.
+        """
+
+        logging.info(f"Planning download of data from {self.parameters.date_from} to {self.parameters.date_until}.")
+
+        from liveagent.planner import Planner
+
+        try:
+            _plan = Planner(self.client, self.parameters, self.get_date_from).plan(self.parameters.objects)
+        except ClientException as c_ex:
+            raise UserException(c_ex) from c_ex
+
+        self.client.close()
+
+        for row in _plan:
+            logging.info(f"Plan of {row['object']}: {row['requests']} requests, {row['rows']} rows, "
+                         f"{row['seconds']:.0f} seconds{'' if row['exact'] else ' (estimated)'}.")
+
+        _writer = LiveAgentWriter(self.tables_out_path, 'run_plan', False)
+        _writer.writerows(_plan)
+        _writer.close()
+
+        self.write_state_file(self.state)
+
+    def download_object(self, obj: str):
+
+        _start = time.perf_counter()
+
+        if obj != 'tickets' and self.get_checkpoint(obj).get('done'):
+            logging.info(f"Data of {obj} were downloaded before the run was resumed. Skipping.")
+            return
+
+        if obj == 'tickets':
+            self.download_tickets()
+
+        else:
+            self.download_table(obj)
+
+        self.metrics.record_object(obj, time.perf_counter() - _start)
+
+    def download_table(self, obj: str):
 
-            logging.info(f"Downloading {obj} data.")
+        if obj in CACHED_ENDPOINTS and self.parameters.cache_ttl > 0:
+            self.download_cached_table(obj)
+            return self.complete_checkpoint(obj, [])
 
-            _writer = LiveAgentWriter(self.tables_out_path, obj, _incremental)
+        logging.info(f"Downloading {obj} data.")
 
-            if obj not in ['tickets_messages', 'tickets', *SUPPORTED_ENDPOINTS_V1]:
+        _endpoint = ENDPOINTS[obj]
+        _get_pages = getattr(self.client, _endpoint.getter)
+        _record = self.get_checkpoint(obj)
+        _position = dict(_record.get('position', {}))
+        _writer = self.get_writer(obj, _record.get('tables', {}).get(obj))
+        _date_from = None
+        _pages = None
 
-                try:
-                    _api_results = eval(f'self.client.get_{obj}()')
-                except ClientException as c_ex:
-                    raise UserException(c_ex) from c_ex
-                _writer.writerows(_api_results)
+        if _endpoint.args == ARGS_DATE_FROM:
+            _date_from = self.get_date_from(obj)
+            _pages = self.track_watermark(obj, _get_pages(date_from=_date_from, position=_position))
 
-            elif obj == 'agent_availability':
+        elif _endpoint.args == ARGS_DATE_RANGE:
+            _pages = _get_pages(self.parameters.date_from, self.parameters.date_until, position=_position)
 
-                try:
-                    _api_results = self.client.get_agent_availability_tickets(self.parameters.date_from,
-                                                                              self.parameters.date_until)
-                except ClientException as c_ex:
-                    raise UserException(c_ex) from c_ex
+        elif _endpoint.args == ARGS_DAILY:
+            self.write_daily_report(obj, _writer, _get_pages)
 
-                _writer.writerows(_api_results)
+        else:
+            _pages = _get_pages(position=_position)
+
+        if _pages is not None:
+            self.write_pages(_writer, self.checkpoint_pages(obj, _pages, [_writer], _position, date_from=_date_from))
+
+        self.complete_checkpoint(obj, [_writer], date_from=_date_from)
+        _writer.close()
+        logging.info(f"Finished downloading {obj} data.")
+
+    def download_cached_table(self, obj: str):
+        """
+        Downloads a slowly changing dimension through the response cache. The cache persists a content hash
+        and download time of every endpoint in the state. Within the TTL, the endpoint is not requested at all;
+        after the TTL, it is downloaded and the table is written only if its content hash changed. In both cases,
+        the table already loaded in storage is kept as is.
+        """
+
+        _key = self.get_cache_key(obj)
+        _entry = self.response_cache.get(_key)
+        _now = time.time()
+
+        if _entry is not None and _now - _entry['downloaded'] < self.parameters.cache_ttl * 3600:
+            logging.info(f"Data of {obj} were downloaded less than {self.parameters.cache_ttl} hours ago. "
+                         f"Using cached data, the table will not be written.")
+            return
+
+        logging.info(f"Downloading {obj} data.")
+
+        try:
+            _pages = list(getattr(self.client, ENDPOINTS[obj].getter)())
+        except ClientException as c_ex:
+            raise UserException(c_ex) from c_ex
+
+        _hash = hashlib.sha256()
+        for page in _pages:
+            _hash.update(codec.dumps(page).encode('utf-8'))
+        _digest = _hash.hexdigest()
+
+        if _entry is not None and _entry['hash'] == _digest:
+            logging.info(f"Data of {obj} did not change since the last download, the table will not be written.")
+
+        else:
+            _writer = self.get_writer(obj)
+            _writer.writepages(_pages)
+            _writer.close()
+
+        self.response_cache[_key] = {'hash': _digest, 'downloaded': _now}
+
+    def get_cache_key(self, obj: str) -> str:
+
+        _params = {'output_format': self.parameters.output_format}
+        _key = f"{self.parameters.organization}|{CACHED_ENDPOINTS[obj]}|{codec.dumps(_params)}"
+
+        return hashlib.sha1(_key.encode('utf-8')).hexdigest()
+
+    def evict_response_cache(self) -> Dict:
+
+        _min_downloaded = time.time() - CACHE_MAX_AGE_DAYS * 86400
+        _entries = sorted([(key, entry) for key, entry in self.response_cache.items()
+                           if entry['downloaded'] >= _min_downloaded], key=lambda e: e[1]['downloaded'], reverse=True)
+
+        return dict(_entries[:CACHE_MAX_ENTRIES])
+
+    def download_tickets(self):
+
+        _objects = self.parameters.objects
+
+        logging.info("Downloading ticket data.")
+
+        _record = self.get_checkpoint('tickets')
+        ticket_activity = dict(_record.get('items', {}))
+        _tickets_date_from = self.get_date_from('tickets')
+
+        if not _record.get('done'):
+
+            _position = dict(_record.get('position', {}))
+            _writer_tickets = self.get_writer('tickets', _record.get('tables', {}).get('tickets'))
+            _messages = 'tickets_messages' in _objects
+
+            # activity of written tickets is checkpointed, messages of a resumed run are downloaded for all tickets
+            def _get_activity(page: List) -> Dict[str, str]:
+                return {row['id']: ticket_activity[row['id']] for row in page}
+
+            _pages = self.collect_activity(self.client.get_tickets(date_from=_tickets_date_from, position=_position),
+                                           ticket_activity)
+            self.write_pages(_writer_tickets, self.checkpoint_pages(
+                'tickets', self.track_watermark('tickets', _pages), [_writer_tickets], _position,
+                _get_activity if _messages else None, date_from=_tickets_date_from))
+
+            self.complete_checkpoint('tickets', [_writer_tickets], ticket_activity if _messages else None,
+                                     date_from=_tickets_date_from)
+            _writer_tickets.close()
+
+        if 'tickets_messages' in _objects:
+            self.download_ticket_messages(ticket_activity, _tickets_date_from)
+
+        logging.info("Finished downloading ticket data.")
+
+    def download_ticket_messages(self, ticket_activity: Dict[str, str], date_from: str):
+
+        _record = self.get_checkpoint('tickets_messages')
+
+        if _record.get('done'):
+            logging.info("Data of tickets_messages were downloaded before the run was resumed. Skipping.")
+            return
+
+        ticket_ids = self.get_active_tickets(ticket_activity)
+        logging.info(f"The component will process messages for {len(ticket_ids)} tickets.")
+
+        _first = _record.get('position', {}).get('ticket', 0)
+        if _first > 0:
+            logging.info(f"Messages of {_first} tickets were processed before the run was resumed.")
+
+        _tables = _record.get('tables', {})
+        _writer_messages = self.get_writer('tickets_messages', _tables.get('tickets_messages'))
+        _content_store = None
+        _schema_content = None
+
+        if self.parameters.offload_bodies > 0:
+            _content_store = ContentStore(self.files_out_path, self.parameters.offload_bodies * 1024)
+            _schema_content = result.TABLES_OFFLOADED_BODIES['tickets_messages_content']
+
+        _writer_content = self.get_writer('tickets_messages_content', _tables.get('tickets_messages_content'),
+                                          _schema_content)
+
+        def _get_ticket_messages(ticket_id: str) -> Iterable[List]:
+            return self.client.get_ticket_messages(ticket_id, date_from=date_from)
+
+        for _ticket, (tid, _pages, _exc) in enumerate(self.map_pages(_get_ticket_messages, ticket_ids[_first:],
+                                                                     self.get_messages_size), _first + 1):
+
+            if _exc is not None:
+                self.handle_ticket_error(tid, _exc)
+                continue
+
+            for _messages in _pages:
+                self.write_messages(tid, _messages, _writer_messages, _writer_content, _content_store)
+
+            # activity is recorded only if all pages of messages were downloaded, otherwise the ticket is retried
+            if ticket_activity[tid] and self.client.is_complete(ENDPOINTS['tickets_messages'].path.format(id=tid)):
+                self.ticket_activity[tid] = ticket_activity[tid]
+
+            self.commit_checkpoint('tickets_messages', {'ticket': _ticket}, [_writer_messages, _writer_content])
 
-            elif obj == 'agent_availability_chats':
+        self.complete_checkpoint('tickets_messages', [_writer_messages, _writer_content])
+        _writer_messages.close()
+        _writer_content.close()
 
-                try:
-                    _api_results = self.client.get_agent_availability_chats(self.parameters.date_from,
-                                                                            self.parameters.date_until)
-                except ClientException as c_ex:
-                    raise UserException(c_ex) from c_ex
+    def get_active_tickets(self, ticket_activity: Dict[str, str]) -> List[str]:
+        """
+        Returns IDs of tickets, whose messages should be downloaded. With skip_inactive_tickets enabled and incremental
+        load, tickets whose activity did not move past the value stored after the last successful download of their
+        messages are skipped.
+        """
 
-                _writer.writerows(_api_results)
+        if not (self.parameters.skip_inactive_tickets and self.parameters.incremental):
+            return list(ticket_activity)
 
-            elif obj == 'calls_availability':
+        _active = [tid for tid, activity in ticket_activity.items()
+                   if not activity or activity > self.ticket_activity.get(tid, '')]
 
-                try:
-                    _api_results = self.client.get_calls_availability(self.parameters.date_from,
-                                                                      self.parameters.date_until)
-                except ClientException as c_ex:
-                    raise UserException(c_ex) from c_ex
+        logging.info(f"Skipping messages of {len(ticket_activity) - len(_active)} tickets without new activity.")
+        return _active
 
-                _writer.writerows(_api_results)
+    def get_ticket_activity_state(self) -> Dict[str, str]:
 
-            elif obj == 'conversations':
+        if not self.parameters.skip_inactive_tickets:
+            return {}
 
-                try:
-                    _api_results = self.client.get_conversations(self.parameters.date_from)
-                except ClientException as c_ex:
-                    raise UserException(c_ex) from c_ex
-                _writer.writerows(_api_results)
+        _tickets = sorted(self.ticket_activity.items(), key=lambda t: t[1], reverse=True)
+        return dict(_tickets[:TICKET_ACTIVITY_MAX_TICKETS])
 
-            elif obj == 'agent_report':
-                for dt in self.parameters.date_chunks:
-                    date = dt['start_date']
-                    start = date + ' 00:00:00'
-                    end = date + ' 23:59:59'
-                    try:
-                        _api_results = self.client.get_agent_report(date_from=start, date_to=end)
-                    except ClientException as c_ex:
-                        raise UserException(c_ex) from c_ex
-                    _writer.writerows(_api_results, parentDict={'date': date})
+    def write_daily_report(self, obj: str, writer: LiveAgentWriter, get_report: Callable[..., Iterator[List]]):
+        """
+        Downloads a v1 report for every day in the date range, using max_workers parallel requests. Days are written
+        in order as soon as they are available. A failed day stops scheduling of further days, but days which were
+        already downloaded are still written before the error is raised. Days written before a failed day are
+        checkpointed, a resumed run continues with the first day which was not written.
+        """
 
-            elif obj == 'ranking_agents_report':
-                for dt in self.parameters.date_chunks:
-                    date = dt['start_date']
-                    start = date + ' 00:00:00'
-                    end = date + ' 23:59:59'
-                    try:
-                        _api_results = self.client.get_ranking_agents_report(date_from=start, date_to=end)
-                    except ClientException as c_ex:
-                        raise UserException(c_ex) from c_ex
-                    _writer.writerows(_api_results, parentDict={'date': date})
+        _failed = []
 
-            elif obj in ['tickets_messages', 'tickets']:
-                pass
+        def _get_day(date_chunk: Dict) -> Iterable[List]:
+            date = date_chunk['start_date']
+            return get_report(date_from=date + ' 00:00:00', date_to=date + ' 23:59:59')
+
+        _first = self.get_checkpoint(obj).get('position', {}).get('chunk', 0)
+        _date_chunks = (dt for dt in self.parameters.date_chunks[_first:] if not _failed)
+
+        for _chunk, (dt, _pages, _exc) in enumerate(self.map_pages(_get_day, _date_chunks), _first + 1):
+
+            date = dt['start_date']
+
+            if _exc is None:
+                writer.writepages(_pages, parentDict={'date': date})
+
+            elif self.parameters.fail_on_error:
+                _failed += [(date, _exc)]
 
             else:
-                raise UserException(f"Unknown object {obj}.")
+                logging.warning(f"Could not download report for date {date}. Skipping.\n{_exc}")
 
-        if 'tickets' in _objects or 'tickets_messages' in _objects:
+            if not _failed:
+                self.commit_checkpoint(obj, {'chunk': _chunk}, [writer])
 
-            logging.info("Downloading ticket data.")
+        if _failed:
+            date, exc = _failed[0]
+            raise UserException(f"Could not download report for date {date}.\n{exc}") from exc
 
-            _writer_tickets = LiveAgentWriter(self.tables_out_path, 'tickets', _incremental)
-            try:
-                _api_results = self.client.get_tickets()
-            except ClientException as c_ex:
-                raise UserException(c_ex) from c_ex
-            _writer_tickets.writerows(_api_results)
+    def map_pages(self, get_pages: Callable[[Any], Iterable[List]], items: Iterable,
+                  size: Callable[[List[List]], int] = None) -> Iterator[Tuple[Any, List[List], Exception]]:
+        """
+        Downloads all pages of get_pages(item) for every item with max_workers parallel requests and yields
+        (item, pages, exception) in order of items. The threads engine uses a thread per request, the asyncio engine
+        multiplexes the requests on the event loop of the client. If size is provided, downloaded pages waiting to be
+        written are kept within the memory budget.
+        """
+
+        _budget = self.parameters.memory_budget * 1024 * 1024 if size is not None else None
+
+        if self.parameters.engine == ENGINE_ASYNCIO:
+            return self.client.map_pages(get_pages, items, self.parameters.max_workers, size, _budget)
+
+        return ordered_map(lambda item: list(get_pages(item)), items, self.parameters.max_workers,
+                           size=size, max_pending_size=_budget)
+
+    @staticmethod
+    def get_messages_size(pages: List[List]) -> int:
+
+        return sum(MESSAGE_SIZE + sum(len(cont.get('message') or '') for cont in msg.get('messages') or [])
+                   for page in pages for msg in page)
+
+    def get_writer(self, table: str, resume_size: int = None, schema: result.TableSchema = None) -> LiveAgentWriter:
+
+        # storage tables are imported from CSV only, columnar files are stored as files
+        _path = self.files_out_path if self.parameters.output_format == FORMAT_PARQUET else self.tables_out_path
+
+        return LiveAgentWriter(_path, table, self.parameters.incremental, self.metrics,
+                               self.parameters.output_format, self.parameters.slice_size,
+                               self.get_row_hash_index(table), resume_size, schema)
+
+    def get_checkpoint(self, obj: str) -> Dict:
+
+        if self.checkpoint is None:
+            return {}
+
+        return self.checkpoint.get(obj)
+
+    def checkpoint_pages(self, obj: str, pages: Iterator[List], writers: List[LiveAgentWriter], position: Dict,
+                         items: Callable[[List], Dict] = None, **values) -> Iterator[List]:
+        """
+        Commits the position of an object to the checkpoint after every page, once the page was written by writers.
+        The client stores the position of the following page before a page is yielded, so the committed position
+        always points to the first page which was not written. Requests split to date windows do not store
+        positions and are not committed until they are finished.
+        """
+
+        for page in pages:
+            yield page
+
+            if position:
+                self.commit_checkpoint(obj, position, writers, items(page) if items is not None else None, **values)
+
+    def commit_checkpoint(self, obj: str, position: Dict, writers: List[LiveAgentWriter], items: Dict = None,
+                          **values):
+
+        if self.checkpoint is None:
+            return
+
+        if obj in self.watermarks:
+            values['watermark'] = self.watermarks[obj]
 
-            if 'tickets_messages' in _objects:
+        self.checkpoint.commit(obj, position, {w.paramTableName: w.flush() for w in writers}, items, **values)
+
+    def complete_checkpoint(self, obj: str, writers: List[LiveAgentWriter], items: Dict = None, **values):
+
+        if self.checkpoint is None:
+            return
+
+        if obj in self.watermarks:
+            values['watermark'] = self.watermarks[obj]
+
+        self.checkpoint.complete(obj, {w.paramTableName: w.flush() for w in writers}, items, **values)
+
+    def get_row_hash_index(self, table: str) -> Optional[RowHashIndex]:
+        """
+        Returns the index of row hashes from the previous run, if unchanged rows should be skipped for the table.
+        Skipping rows is only possible with incremental load, since a full load replaces the table.
+        """
+
+        if not (self.parameters.skip_unchanged and self.parameters.incremental) or table not in ROW_HASH_TABLES:
+            return None
+
+        _fields = result.TABLES[table].fieldsRenamed
+        _pk = result.TABLES[table].primaryKey
+
+        try:
+            _index = RowHashIndex(_fields, _pk, self.state.get(STATE_ROW_HASHES, {}).get(table))
+        except (ValueError, zlib.error):
+            logging.warning(f"Could not read row hashes of table {table}. All rows will be written.")
+            _index = RowHashIndex(_fields, _pk)
+
+        self.row_hashes[table] = _index
+        return _index
+
+    def get_row_hashes_state(self) -> Dict:
+
+        _state = dict(self.state.get(STATE_ROW_HASHES, {}))
+
+        # skipped rows are reported with the written rows in run metrics
+        for table, index in self.row_hashes.items():
+            _state[table] = index.encode()
+
+        return _state
+
+    def write_run_metrics(self):
+
+        _run_id = os.environ.get('KBC_RUNID', '')
+        _date = datetime.datetime.utcnow().strftime(DATE_FORMAT)
+
+        _writer = LiveAgentWriter(self.tables_out_path, 'run_metrics', True)
+        _writer.writerows([{**row, 'run_id': _run_id, 'date': _date} for row in self.metrics.get_rows()])
+        _writer.close()
+
+    def handle_ticket_error(self, ticket_id: str, exc: Exception):
+
+        if self.parameters.fail_on_error:
+            if isinstance(exc, ClientException):
+                raise UserException(exc) from exc
+            raise exc
+
+        logging.warning(f"Could not download messages for ticket {ticket_id}. Skipping.\n{exc}")
+
+    @staticmethod
+    def write_pages(writer: LiveAgentWriter, pages: Iterator[List], parentDict: Dict = None):
+
+        try:
+            writer.writepages(pages, parentDict=parentDict)
+        except ClientException as c_ex:
+            raise UserException(c_ex) from c_ex
 
-                ticket_ids = [t['id'] for t in _api_results]
+    @staticmethod
+    def collect_activity(pages: Iterator[List], activity: Dict[str, str]) -> Iterator[List]:
 
-                logging.info(f"The component will process messages for {len(ticket_ids)} tickets.")
+        for page in pages:
+            for row in page:
+                activity[row['id']] = max([row.get(field) or '' for field in TICKET_ACTIVITY_FIELDS])
+            yield page
 
-                _writer_messages = LiveAgentWriter(self.tables_out_path, 'tickets_messages', _incremental)
-                _writer_content = LiveAgentWriter(self.tables_out_path, 'tickets_messages_content',
-                                                  _incremental)
+    @staticmethod
+    def write_messages(ticket_id: str, messages: List, writer_messages: LiveAgentWriter,
+                       writer_content: LiveAgentWriter, content_store: ContentStore = None):
 
-                _out_messages = []
-                _out_contents = []
+        _out_contents = []
 
-                for tid in ticket_ids:
-                    try:
-                        _messages = self.client.get_ticket_messages(tid)
+        for msg in messages:
+            msg['ticket_id'] = ticket_id
+            msg_id = msg['id']
 
-                    except ClientException as c_ex:
-                        raise UserException(c_ex) from c_ex
+            for cont in msg['messages']:
+                cont['message_id'] = msg_id
 
-                    for msg in _messages:
-                        msg['ticket_id'] = tid
-                        msg_id = msg['id']
+                if content_store is not None:
+                    _file = content_store.offload(cont.get('message'), cont.get('format'))
 
-                        _out_messages += [msg]
+                    if _file is not None:
+                        cont['message'] = ''
+                        cont['message_file'] = _file
 
-                        for cont in msg['messages']:
-                            cont['message_id'] = msg_id
-                            _out_contents += [cont]
+                _out_contents += [cont]
 
-                _writer_messages.writerows(_out_messages)
-                _writer_content.writerows(_out_contents)
+        writer_messages.writerows(messages)
+        writer_content.writerows(_out_contents)
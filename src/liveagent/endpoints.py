@@ -0,0 +1,113 @@
+"""
+Registry of objects, which can be downloaded by the component. Every object is described by its endpoint, API version,
+pagination, date filter, result key, output tables and the object it depends on. The client builds requests of objects
+from the registry, the component and the planner dispatch on it, instead of on names of objects.
+"""
+from typing import List
+
+API_V3 = 'v3'
+API_V1 = 'v1'
+
+# page sizes of v3 pages and v1 offsets
+PAGE_LIMIT = 500
+LIMIT_SIZE = 1000
+# maximum number of requests per minute with a single API key, 0 sets no fixed maximum and the rate is found
+# from responses throttled by the API
+RATE_LIMIT = 0
+
+DATE_FILTER_FIELD_CALLS = 'dateCreated'
+DATE_FILTER_FIELD_CHATS = 'date_created'
+DATE_FILTER_FIELD_COMPS = 'datechanged'
+DATE_FILTER_FIELD_CONTS = 'datechanged'
+DATE_FILTER_FIELD_TCKTS = 'date_changed'
+DATE_FILTER_FIELD_MESGS = 'datecreated'
+DATE_FILTER_FIELD_HSTRY = 'date_from'
+
+# conversations are paginated either by offset or by the keyset of the last row, i.e. its datechanged and, for rows
+# changed in the same second, its id
+PAGINATION_OFFSET = 'offset'
+PAGINATION_KEYSET = 'keyset'
+PAGINATIONS = [PAGINATION_OFFSET, PAGINATION_KEYSET]
+KEYSET_FIELD = 'datechanged'
+KEYSET_ID_FIELD = 'conversationid'
+KEYSET_SORT = {'sort_field': KEYSET_FIELD, 'sort_direction': 'ASC'}
+CHANNEL_TYPES = ['E', 'B', 'M', 'I', 'C', 'W', 'F', 'A', 'T', 'Q', 'S']
+
+METHOD_PAGE = 'page'
+METHOD_CURSOR = 'cursor'
+METHOD_LIMIT = 'limit'
+
+# arguments of the getter of the client
+ARGS_NONE = 'none'
+ARGS_DATE_FROM = 'date_from'
+ARGS_DATE_RANGE = 'date_range'
+ARGS_DAILY = 'daily'
+ARGS_TICKET = 'ticket'
+
+
+class Endpoint:
+    """
+    Description of a single object. Path may contain {id} of the ticket for objects downloaded per ticket. Limit and
+    offset parameters name the parameters of v1 offset pagination. Getter is the method of the client returning
+    pages of the object, args describes its arguments:
+        - none: getter(position),
+        - date_from: getter(date_from, position), the start of the date range is moved by the watermark,
+        - date_range: getter(date_from, date_to, position), for the whole date range,
+        - daily: getter(date_from, date_to, position), called for every day of the date range,
+        - ticket: getter(ticket_id, date_from, position), called for every ticket of the object it depends on.
+    """
+
+    def __init__(self, name: str, path: str, version: str, method: str, getter: str, args: str,
+                 filter_field: str = None, result_key: str = None, watermark_field: str = None,
+                 tables: List[str] = None, depends_on: str = None, cached: bool = False, sharded: bool = False,
+                 limit_param: str = 'limitcount', offset_param: str = 'limitfrom'):
+
+        self.name = name
+        self.path = path
+        self.version = version
+        self.method = method
+        self.getter = getter
+        self.args = args
+        self.filter_field = filter_field
+        self.result_key = result_key
+        self.watermark_field = watermark_field
+        self.tables = [name] if tables is None else tables
+        self.depends_on = depends_on
+        self.cached = cached
+        self.sharded = sharded
+        self.limit_param = limit_param
+        self.offset_param = offset_param
+        self.page_size = PAGE_LIMIT if version == API_V3 else LIMIT_SIZE
+
+
+ENDPOINTS = {endpoint.name: endpoint for endpoint in [
+    Endpoint('agents', 'v3/agents', API_V3, METHOD_PAGE, 'get_agents', ARGS_NONE, cached=True),
+    Endpoint('calls', 'v3/calls', API_V3, METHOD_CURSOR, 'get_calls', ARGS_DATE_FROM,
+             filter_field=DATE_FILTER_FIELD_CALLS, watermark_field='dateCreated', sharded=True),
+    Endpoint('companies', 'v3/companies', API_V3, METHOD_PAGE, 'get_companies', ARGS_DATE_FROM,
+             filter_field=DATE_FILTER_FIELD_COMPS, watermark_field='date_changed', sharded=True),
+    Endpoint('contacts', 'v3/contacts', API_V3, METHOD_PAGE, 'get_contacts', ARGS_DATE_FROM,
+             filter_field=DATE_FILTER_FIELD_CONTS, watermark_field='date_changed', sharded=True),
+    Endpoint('departments', 'v3/departments', API_V3, METHOD_PAGE, 'get_departments', ARGS_NONE, cached=True),
+    Endpoint('tags', 'v3/tags', API_V3, METHOD_PAGE, 'get_tags', ARGS_NONE, cached=True),
+    Endpoint('tickets', 'v3/tickets', API_V3, METHOD_PAGE, 'get_tickets', ARGS_DATE_FROM,
+             filter_field=DATE_FILTER_FIELD_TCKTS, watermark_field='date_changed', sharded=True),
+    Endpoint('tickets_messages', 'v3/tickets/{id}/messages', API_V3, METHOD_PAGE, 'get_ticket_messages', ARGS_TICKET,
+             filter_field=DATE_FILTER_FIELD_MESGS, tables=['tickets_messages', 'tickets_messages_content'],
+             depends_on='tickets'),
+    Endpoint('tickets_history', 'v3/tickets/history', API_V3, METHOD_CURSOR, 'get_tickets_history', ARGS_DATE_FROM,
+             filter_field=DATE_FILTER_FIELD_HSTRY, watermark_field='date_from', sharded=True),
+    Endpoint('agent_report', 'reports/agents', API_V1, METHOD_LIMIT, 'get_agent_report', ARGS_DAILY,
+             result_key='agents'),
+    Endpoint('agent_availability', 'reports/tickets/agentsavailability', API_V1, METHOD_LIMIT,
+             'get_agent_availability_tickets', ARGS_DATE_RANGE, result_key='agentsavailability'),
+    Endpoint('conversations', 'conversations', API_V1, METHOD_LIMIT, 'get_conversations', ARGS_DATE_FROM,
+             filter_field=KEYSET_FIELD, result_key='conversations', watermark_field='datechanged', limit_param='limit',
+             offset_param='offset'),
+    Endpoint('agent_availability_chats', 'reports/chats/agentsavailability', API_V1, METHOD_LIMIT,
+             'get_agent_availability_chats', ARGS_DATE_RANGE, result_key='agentsavailability'),
+    Endpoint('calls_availability', 'reports/calls/availability', API_V1, METHOD_LIMIT, 'get_calls_availability',
+             ARGS_DATE_RANGE, result_key='availability'),
+    Endpoint('ranking_agents_report', 'reports/ranking', API_V1, METHOD_LIMIT, 'get_ranking_agents_report',
+             ARGS_DAILY, result_key='ranks')
+]}
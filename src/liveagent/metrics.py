@@ -0,0 +1,185 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List
+
+
+class EndpointStats:
+
+    def __init__(self):
+
+        self.requests = 0
+        self.pages = 0
+        self.retries = 0
+        self.bytes = 0
+        self.wire_bytes = 0
+        self.http_seconds = 0.0
+        self.decode_seconds = 0.0
+        self.latencies = []
+
+
+class TableStats:
+
+    def __init__(self):
+
+        self.rows = 0
+        self.skipped_rows = 0
+        self.write_seconds = 0.0
+
+
+class RunMetrics:
+    """
+    Thread-safe collector of performance statistics of a single run. Requests are recorded per endpoint
+    (parametrized endpoints are grouped by their label), written rows per table and wall time per object.
+    """
+
+    def __init__(self):
+
+        self.endpoints = defaultdict(EndpointStats)
+        self.tables = defaultdict(TableStats)
+        self.objects = {}
+        self.connections = 0
+        self.pool_requests = 0
+
+        self._lock = threading.Lock()
+
+    def record_request(self, endpoint: str, seconds: float):
+
+        with self._lock:
+            _stats = self.endpoints[endpoint]
+            _stats.requests += 1
+            _stats.http_seconds += seconds
+            _stats.latencies += [seconds]
+
+    def record_page(self, endpoint: str, size: int, decode_seconds: float, wire_size: int = None):
+        """
+        Records a downloaded page. Size is the size of the decoded body, wire size the size of the body as received,
+        which differs for compressed responses.
+        """
+
+        with self._lock:
+            _stats = self.endpoints[endpoint]
+            _stats.pages += 1
+            _stats.bytes += size
+            _stats.wire_bytes += size if wire_size is None else wire_size
+            _stats.decode_seconds += decode_seconds
+
+    def record_retry(self, endpoint: str):
+
+        with self._lock:
+            self.endpoints[endpoint].retries += 1
+
+    def record_write(self, table: str, rows: int, seconds: float, skipped_rows: int = 0):
+        """
+        Records rows written to a table. Skipped rows are unchanged rows, which were downloaded but not written.
+        """
+
+        with self._lock:
+            _stats = self.tables[table]
+            _stats.rows += rows
+            _stats.skipped_rows += skipped_rows
+            _stats.write_seconds += seconds
+
+    def record_pool(self, connections: int, requests: int):
+
+        with self._lock:
+            self.connections = connections
+            self.pool_requests = requests
+
+    def record_object(self, obj: str, seconds: float):
+
+        with self._lock:
+            self.objects[obj] = seconds
+
+    def get_retries(self) -> Dict[str, int]:
+
+        with self._lock:
+            return {endpoint: stats.retries for endpoint, stats in self.endpoints.items() if stats.retries}
+
+    def get_rows(self) -> List[Dict]:
+        """
+        Returns the statistics as rows of the run_metrics table, one row per endpoint, table and object and a row
+        with statistics of the connection pool.
+        """
+
+        rows = []
+
+        with self._lock:
+            for endpoint, stats in sorted(self.endpoints.items()):
+                _latencies = sorted(stats.latencies)
+                rows += [{
+                    'type': 'endpoint',
+                    'name': endpoint,
+                    'requests': stats.requests,
+                    'pages': stats.pages,
+                    'retries': stats.retries,
+                    'bytes': stats.bytes,
+                    'wire_bytes': stats.wire_bytes,
+                    'latency_p50': round(percentile(_latencies, 50), 4),
+                    'latency_p90': round(percentile(_latencies, 90), 4),
+                    'latency_p99': round(percentile(_latencies, 99), 4),
+                    'http_seconds': round(stats.http_seconds, 3),
+                    'decode_seconds': round(stats.decode_seconds, 3)
+                }]
+
+            for table, stats in sorted(self.tables.items()):
+                rows += [{
+                    'type': 'table',
+                    'name': table,
+                    'rows': stats.rows,
+                    'skipped_rows': stats.skipped_rows,
+                    'write_seconds': round(stats.write_seconds, 3)
+                }]
+
+            for obj, seconds in sorted(self.objects.items()):
+                rows += [{
+                    'type': 'object',
+                    'name': obj,
+                    'seconds': round(seconds, 3)
+                }]
+
+            if self.pool_requests:
+                rows += [{
+                    'type': 'pool',
+                    'name': 'http',
+                    'requests': self.pool_requests,
+                    'connections': self.connections
+                }]
+
+        return rows
+
+    def log_summary(self):
+
+        for row in self.get_rows():
+
+            if row['type'] == 'endpoint':
+                logging.info(f"Endpoint {row['name']}: {row['requests']} requests, {row['pages']} pages, "
+                             f"{row['retries']} retries, {row['bytes'] / 1048576:.1f} MB "
+                             f"({row['wire_bytes'] / 1048576:.1f} MB transferred), latency p50/p90/p99 "
+                             f"{row['latency_p50']:.2f}/{row['latency_p90']:.2f}/{row['latency_p99']:.2f} s, "
+                             f"HTTP {row['http_seconds']:.1f} s, JSON decode {row['decode_seconds']:.1f} s.")
+
+            elif row['type'] == 'table':
+                _skipped = f", {row['skipped_rows']} unchanged rows skipped" if row['skipped_rows'] else ''
+                logging.info(f"Table {row['name']}: {row['rows']} rows written{_skipped} "
+                             f"in {row['write_seconds']:.1f} s.")
+
+            elif row['type'] == 'pool':
+                _reuse = 1 - row['connections'] / row['requests']
+                logging.info(f"Connection pool: {row['requests']} requests over {row['connections']} connections, "
+                             f"{_reuse:.1%} of requests reused a connection.")
+
+            else:
+                logging.info(f"Object {row['name']} downloaded in {row['seconds']:.1f} s.")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+
+    if not values:
+        return 0.0
+
+    _rank = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[_rank]
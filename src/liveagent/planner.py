@@ -0,0 +1,227 @@
+"""
+Planner of a run, which estimates the number of requests, rows and the runtime of every object before the data
+are downloaded, so long backfills can be sized and split before they are started.
+
+Objects with numbered pagination (v3 pages, v1 offsets) are counted exactly: the first page is probed and, if it is
+full, pages further on are probed with exponentially growing and then bisected positions, until the last page is found
+in about 2 * log2(pages) requests. Cursor pagination cannot skip pages, rows are extrapolated from the part of the date
+range covered by the first page. Daily reports are probed for a sample of days and messages for a sample of tickets.
+The runtime is estimated from the latency of the probes, parallelism and rate limits of the configuration.
+"""
+import logging
+import math
+import time
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from liveagent.client import LiveAgentClient
+from liveagent.endpoints import ENDPOINTS, Endpoint, ARGS_DAILY, ARGS_DATE_FROM, ARGS_DATE_RANGE, ARGS_TICKET, \
+    METHOD_CURSOR, METHOD_PAGE
+from liveagent.utils import Parameters
+
+PLAN_MAX_PAGES = 2 ** 20
+PLAN_SAMPLE_DAYS = 3
+PLAN_SAMPLE_TICKETS = 5
+PLAN_TOTAL = 'total'
+
+
+class Planner:
+
+    def __init__(self, client: LiveAgentClient, parameters: Parameters, get_date_from: Callable[[str], str]):
+
+        self.client = client
+        self.parameters = parameters
+        self.get_date_from = get_date_from
+
+        self.probes = 0
+        self.probe_seconds = 0.0
+        self.first_pages = {}
+        self.estimates = {}
+
+    def plan(self, objects: Iterable[str]) -> List[Dict]:
+        """
+        Returns the estimate of every object, together with the objects they depend on, and of the whole run.
+        """
+
+        _objects = []
+        for obj in objects:
+            _depends_on = ENDPOINTS[obj].depends_on
+            _objects += [o for o in [_depends_on, obj] if o is not None and o not in _objects]
+
+        _rows = []
+
+        for obj in _objects:
+            _endpoint = ENDPOINTS[obj]
+            _date_from = self.get_date_from(obj) if _endpoint.args in (ARGS_DATE_FROM, ARGS_TICKET) \
+                else self.parameters.date_from
+
+            logging.info(f"Probing {obj} data.")
+            requests, rows, exact = self.estimate(_endpoint, _date_from)
+            self.estimates[obj] = (requests, rows, exact)
+
+            _rows += [{'object': obj, 'date_from': _date_from, 'date_until': self.parameters.date_until,
+                       'requests': requests, 'rows': rows, 'exact': exact}]
+
+        _latency = self.probe_seconds / self.probes if self.probes else 0
+        # without a fixed rate limit, the runtime is limited by latency and parallelism only
+        _rate = self.parameters.rate_limit / 60 if self.parameters.rate_limit else math.inf
+
+        for row in _rows:
+            _concurrency = self.get_concurrency(ENDPOINTS[row['object']])
+            row['seconds'] = round(max(row['requests'] * _latency / _concurrency, row['requests'] / _rate), 1)
+
+        # objects are downloaded in parallel, but every API version has its own rate limit
+        _requests_version = {}
+        for row in _rows:
+            _version = ENDPOINTS[row['object']].version
+            _requests_version[_version] = _requests_version.get(_version, 0) + row['requests']
+
+        _seconds = max([sum(row['seconds'] for row in _rows) / self.parameters.parallel_objects]
+                       + [row['seconds'] for row in _rows]
+                       + [requests / _rate for requests in _requests_version.values()])
+
+        _rows += [{'object': PLAN_TOTAL, 'date_from': self.parameters.date_from,
+                   'date_until': self.parameters.date_until, 'requests': sum(row['requests'] for row in _rows),
+                   'rows': sum(row['rows'] for row in _rows), 'seconds': round(_seconds, 1),
+                   'exact': all(row['exact'] for row in _rows)}]
+
+        logging.info(f"Plan was estimated with {self.probes} requests, average latency {_latency:.3f} seconds.")
+        return _rows
+
+    def get_concurrency(self, endpoint: Endpoint) -> int:
+
+        if endpoint.args in (ARGS_DAILY, ARGS_TICKET):
+            return self.parameters.max_workers
+
+        if endpoint.sharded:
+            return max(self.parameters.date_shards, self.parameters.prefetch_pages)
+
+        return self.parameters.prefetch_pages
+
+    def estimate(self, endpoint: Endpoint, date_from: str) -> Tuple[int, int, bool]:
+
+        _get_pages = getattr(self.client, endpoint.getter)
+
+        if endpoint.args == ARGS_TICKET:
+            return self.estimate_tickets(endpoint, _get_pages, date_from)
+
+        if endpoint.args == ARGS_DAILY:
+            return self.estimate_days(endpoint, _get_pages)
+
+        def _pages_at(position: Dict) -> Iterable[List]:
+
+            if endpoint.args == ARGS_DATE_FROM:
+                return _get_pages(date_from=date_from, position=position)
+
+            elif endpoint.args == ARGS_DATE_RANGE:
+                return _get_pages(date_from, self.parameters.date_until, position=position)
+
+            return _get_pages(position=position)
+
+        return self.estimate_pages(endpoint, _pages_at, date_from)
+
+    def estimate_pages(self, endpoint: Endpoint, pages_at: Callable[[Dict], Iterable[List]],
+                       date_from: str) -> Tuple[int, int, bool]:
+        """
+        Returns the number of requests and rows of a paginated request and whether they are exact.
+        """
+
+        _size = endpoint.page_size
+        _first = self.probe(pages_at, {})
+        self.first_pages.setdefault(endpoint.name, _first)
+
+        if len(_first) < _size:
+            return 1, len(_first), True
+
+        if endpoint.method == METHOD_CURSOR:
+            return self.extrapolate(endpoint, _first, date_from)
+
+        def _position(index: int) -> Dict:
+            return {'page': index + 1} if endpoint.method == METHOD_PAGE else {'offset': index * _size}
+
+        # page low is full and page high is not, the last page is searched in between
+        _low, _high = 0, 1
+        _last = len(self.probe(pages_at, _position(_high)))
+
+        while _last == _size:
+            if _high >= PLAN_MAX_PAGES:
+                return _high + 1, (_high + 1) * _size, False
+
+            _low, _high = _high, _high * 2
+            _last = len(self.probe(pages_at, _position(_high)))
+
+        while _high - _low > 1:
+            _middle = (_low + _high) // 2
+            _length = len(self.probe(pages_at, _position(_middle)))
+
+            if _length == _size:
+                _low = _middle
+            else:
+                _high, _last = _middle, _length
+
+        return _high + 1, _high * _size + _last, True
+
+    def extrapolate(self, endpoint: Endpoint, first_page: List, date_from: str) -> Tuple[int, int, bool]:
+
+        _values = sorted(row[endpoint.watermark_field] for row in first_page if row.get(endpoint.watermark_field))
+        _page_span = LiveAgentClient._get_span(_values[0], _values[-1]) if _values else 0
+        _span = LiveAgentClient._get_span(date_from, self.parameters.date_until)
+
+        if _page_span <= 0 or _span <= 0:
+            return 2, len(first_page), False
+
+        _rows = max(len(first_page), int(len(first_page) * _span / _page_span))
+        return math.ceil(_rows / endpoint.page_size), _rows, False
+
+    def estimate_days(self, endpoint: Endpoint, get_pages: Callable[..., Iterable[List]]) -> Tuple[int, int, bool]:
+
+        _days = [chunk['start_date'] for chunk in self.parameters.date_chunks]
+
+        if not _days:
+            return 0, 0, True
+
+        _sample = sorted(set(_days[int(idx * (len(_days) - 1) / max(PLAN_SAMPLE_DAYS - 1, 1))]
+                             for idx in range(PLAN_SAMPLE_DAYS)))
+
+        _estimates = [self.estimate_pages(endpoint, lambda position, day=day: get_pages(
+            date_from=day + ' 00:00:00', date_to=day + ' 23:59:59', position=position), day) for day in _sample]
+
+        return self.scale(_estimates, len(_days))
+
+    def estimate_tickets(self, endpoint: Endpoint, get_pages: Callable[..., Iterable[List]],
+                         date_from: str) -> Tuple[int, int, bool]:
+        """
+        Messages are estimated for a sample of tickets from the first page of tickets. Tickets skipped for inactivity
+        are not taken into account, the estimate is an upper bound.
+        """
+
+        _, _rows_tickets, _exact = self.estimates[endpoint.depends_on]
+        _sample = [row['id'] for row in self.first_pages.get(endpoint.depends_on, [])[:PLAN_SAMPLE_TICKETS]]
+
+        if not _sample:
+            return 0, 0, _exact
+
+        _estimates = [self.estimate_pages(endpoint, lambda position, tid=tid: get_pages(
+            tid, date_from=date_from, position=position), date_from) for tid in _sample]
+
+        requests, rows, exact = self.scale(_estimates, _rows_tickets)
+        return requests, rows, exact and _exact
+
+    @staticmethod
+    def scale(estimates: List[Tuple[int, int, bool]], count: int) -> Tuple[int, int, bool]:
+
+        _requests = sum(estimate[0] for estimate in estimates)
+        _rows = sum(estimate[1] for estimate in estimates)
+        _exact = all(estimate[2] for estimate in estimates) and len(estimates) == count
+
+        return round(_requests * count / len(estimates)), round(_rows * count / len(estimates)), _exact
+
+    def probe(self, pages_at: Callable[[Dict], Iterable[Any]], position: Dict) -> List:
+
+        _start = time.perf_counter()
+
+        with closing(iter(pages_at(dict(position)))) as pages:
+            page = next(pages, [])
+
+        self.probes += 1
+        self.probe_seconds += time.perf_counter() - _start
+        return page
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by all requests made with a single API key.
+
+    Without max_rate, requests are not limited until the API responds with 429. The rate is then set to half
+    of the rate observed in the last OBSERVED_SECONDS and the bucket is paused for the duration of the Retry-After
+    header. Every successful request raises the rate by 1 / RECOVERY_REQUESTS of itself, so the limiter probes
+    upwards for the highest rate the API sustains and backs off only when it is throttled again. With max_rate,
+    the rate never exceeds it.
+    """
+
+    DECREASE_FACTOR = 0.5
+    RECOVERY_REQUESTS = 100
+    OBSERVED_SECONDS = 10.0
+
+    def __init__(self, max_rate: float = None, min_rate: float = 0.1):
+
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate) if max_rate is not None else min_rate
+        # None until the first 429 without max_rate, i.e. requests are not limited
+        self.rate = max_rate
+        self.tokens = 1.0
+        self.blocked_until = 0.0
+        self.throttled = 0
+
+        self._updated = time.monotonic()
+        self._requests = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+
+        while True:
+
+            wait = self._reserve()
+
+            if wait == 0:
+                return
+
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Same as acquire, but waits without blocking the event loop.
+        """
+
+        while True:
+
+            wait = self._reserve()
+
+            if wait == 0:
+                return
+
+            await asyncio.sleep(wait)
+
+    def success(self):
+
+        with self._lock:
+            if self.rate is not None:
+                _rate = self.rate * (1 + 1 / self.RECOVERY_REQUESTS)
+                self.rate = _rate if self.max_rate is None else min(self.max_rate, _rate)
+
+    def throttle(self, retry_after: float):
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            self.throttled += 1
+
+            # requests sent before the bucket was paused are throttled too, the rate is lowered once per pause
+            if now >= self.blocked_until:
+                _observed = self.get_observed_rate(now)
+                _rate = _observed if self.rate is None else min(self.rate, _observed)
+                self.rate = max(self.min_rate, _rate * self.DECREASE_FACTOR)
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def _reserve(self) -> float:
+        """
+        Takes a token if one is available and returns 0, otherwise returns the time to wait before trying again.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if now < self.blocked_until:
+                return self.blocked_until - now
+
+            elif self.rate is None or self.tokens >= 1:
+                self.tokens = max(0.0, self.tokens - 1)
+                self._requests.append(now)
+                self._forget(now)
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+    def get_observed_rate(self, now: float) -> float:
+        """
+        Returns the rate of requests per second let through in the last OBSERVED_SECONDS.
+        """
+
+        self._forget(now)
+        _span = min(self.OBSERVED_SECONDS, max(now - self._requests[0], 1.0)) if self._requests else 1.0
+        return len(self._requests) / _span
+
+    def _forget(self, now: float):
+
+        while self._requests and self._requests[0] < now - self.OBSERVED_SECONDS:
+            self._requests.popleft()
+
+    def _refill(self, now: float):
+
+        if self.rate is not None:
+            _burst = max(1.0, self.rate)
+            self.tokens = min(_burst, self.tokens + (now - self._updated) * self.rate)
+
+        self._updated = now
@@ -1,6 +1,31 @@
 import os
-import csv
+import base64
+import datetime
+import gzip
+import hashlib
+import io
 import json
+import logging
+import time
+import zlib
+from liveagent import codec
+from liveagent.utils import parse_date
+
+FORMAT_CSV = 'csv'
+FORMAT_CSV_GZIP_SLICED = 'csv_gzip_sliced'
+FORMAT_PARQUET = 'parquet'
+OUTPUT_FORMATS = [FORMAT_CSV, FORMAT_CSV_GZIP_SLICED, FORMAT_PARQUET]
+SLICE_SIZE_MB = 100
+GZIP_LEVEL = 6
+ROW_GROUP_SIZE = 100000
+PARQUET_COMPRESSION = 'zstd'
+TIMESTAMP_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+# dates, which are not named date or date_*
+TIMESTAMP_FIELDS = ['last_activity', 'last_activity_public', 'status_date_started']
+ROW_HASH_SIZE = 8
+MESSAGE_FILE_PREFIX = 'liveagent_message_'
+MESSAGE_FILE_EXTENSIONS = {'H': '.html'}
+ROW_HASH_MAX_ROWS = 50000
 
 FIELDS_AGENTS = ['id', 'name', 'email', 'role', 'avatar_url', 'online_status', 'status', 'gender']
 FIELDS_R_AGENTS = FIELDS_AGENTS
@@ -117,6 +142,8 @@ FIELDS_R_AGENT_REPORT = ['agent_id', 'date', 'contact_id', 'first_name', 'last_n
                          'calls_internal', 'call_internal_avg_time', 'call_internal_seconds', 'o_calls']
 PK_AGENT_REPORT = ['agent_id', 'date']
 JSON_AGENT_REPORT = []
+NUMERIC_AGENT_REPORT = [field for field in FIELDS_R_AGENT_REPORT
+                        if field not in ['agent_id', 'date', 'contact_id', 'first_name', 'last_name']]
 
 FIELDS_RANKING_AGENTS_REPORT = ['id', "rankingType", "datecreated", 'conversationid', 'agentcontactid', 'agentEmail',
                                 'agent', 'contactid', 'requesterEmail', 'requester', 'comment']
@@ -139,26 +166,394 @@ FIELDS_R_CALLS_AVAILABILITY = ['date', 'minutes', 'percentage']
 PK_CALLS_AVAILABILITY = ['date']
 JSON_CALLS_AVAILABILITY = []
 
+FIELDS_RUN_METRICS = ['run_id', 'date', 'type', 'name', 'requests', 'pages', 'retries', 'bytes', 'wire_bytes',
+                      'latency_p50', 'latency_p90', 'latency_p99', 'http_seconds', 'decode_seconds', 'rows',
+                      'write_seconds', 'seconds', 'connections', 'skipped_rows']
+FIELDS_R_RUN_METRICS = FIELDS_RUN_METRICS
+PK_RUN_METRICS = ['run_id', 'type', 'name']
+JSON_RUN_METRICS = []
+
+FIELDS_RUN_PLAN = ['object', 'date_from', 'date_until', 'requests', 'rows', 'seconds', 'exact']
+FIELDS_R_RUN_PLAN = FIELDS_RUN_PLAN
+PK_RUN_PLAN = ['object']
+JSON_RUN_PLAN = []
+
+
+class TableSchema:
+    """
+    Columns of an output table: fields read from the API, names of the written columns, primary key, fields
+    written as JSON and renamed columns holding numbers, which are typed as floats in columnar output.
+    """
+
+    def __init__(self, fields, fieldsRenamed, primaryKey, jsonFields, numericFields=None):
+
+        self.fields = fields
+        self.fieldsRenamed = fieldsRenamed
+        self.primaryKey = primaryKey
+        self.jsonFields = jsonFields
+        self.numericFields = numericFields or []
+
+
+TABLES = {
+    'agents': TableSchema(FIELDS_AGENTS, FIELDS_R_AGENTS, PK_AGENTS, JSON_AGENTS),
+    'calls': TableSchema(FIELDS_CALLS, FIELDS_R_CALLS, PK_CALLS, JSON_CALLS),
+    'chats': TableSchema(FIELDS_CHATS, FIELDS_R_CHATS, PK_CHATS, JSON_CHATS),
+    'companies': TableSchema(FIELDS_COMPANIES, FIELDS_R_COMPANIES, PK_COMPANIES, JSON_COMPANIES),
+    'contacts': TableSchema(FIELDS_CONTACTS, FIELDS_R_CONTACTS, PK_CONTACTS, JSON_CONTACTS),
+    'departments': TableSchema(FIELDS_DEPARTMENTS, FIELDS_R_DEPARTMENTS, PK_DEPARTMENTS, JSON_DEPARTMENTS),
+    'tags': TableSchema(FIELDS_TAGS, FIELDS_R_TAGS, PK_TAGS, JSON_TAGS),
+    'tickets': TableSchema(FIELDS_TICKETS, FIELDS_R_TICKETS, PK_TICKETS, JSON_TICKETS),
+    'tickets_messages': TableSchema(FIELDS_TICKETS_MESSAGES, FIELDS_R_TICKETS_MESSAGES, PK_TICKETS_MESSAGES,
+                                    JSON_TICKETS_MESSAGES),
+    'tickets_history': TableSchema(FIELDS_TICKETS_HISTORY, FIELDS_R_TICKETS_HISTORY, PK_TICKETS_HISTORY,
+                                   JSON_TICKETS_HISTORY),
+    'tickets_messages_content': TableSchema(FIELDS_TICKETS_MESSAGES_CONTENT, FIELDS_R_TICKETS_MESSAGES_CONTENT,
+                                            PK_TICKETS_MESSAGES_CONTENT, JSON_TICKETS_MESSAGES_CONTENT),
+    'agent_availability': TableSchema(FIELDS_AGENT_AVAILABILITY, FIELDS_R_AGENT_AVAILABILITY, PK_AGENT_AVAILABILITY,
+                                      JSON_AGENT_AVAILABILITY),
+    'agent_availability_chats': TableSchema(FIELDS_AGENT_AVAILABILITY_CHATS, FIELDS_R_AGENT_AVAILABILITY_CHATS,
+                                            PK_AGENT_AVAILABILITY_CHATS, JSON_AGENT_AVAILABILITY_CHATS),
+    'agent_report': TableSchema(FIELDS_AGENT_REPORT, FIELDS_R_AGENT_REPORT, PK_AGENT_REPORT, JSON_AGENT_REPORT,
+                                NUMERIC_AGENT_REPORT),
+    'ranking_agents_report': TableSchema(FIELDS_RANKING_AGENTS_REPORT, FIELDS_R_RANKING_AGENTS_REPORT,
+                                         PK_RANKING_AGENTS_REPORT, JSON_RANKING_AGENTS_REPORT),
+    'conversations': TableSchema(FIELDS_CONVERSATIONS, FIELDS_R_CONVERSATIONS, PK_CONVERSATIONS, JSON_CONVERSATIONS),
+    'calls_availability': TableSchema(FIELDS_CALLS_AVAILABILITY, FIELDS_R_CALLS_AVAILABILITY, PK_CALLS_AVAILABILITY,
+                                      JSON_CALLS_AVAILABILITY),
+    'run_metrics': TableSchema(FIELDS_RUN_METRICS, FIELDS_R_RUN_METRICS, PK_RUN_METRICS, JSON_RUN_METRICS),
+    'run_plan': TableSchema(FIELDS_RUN_PLAN, FIELDS_R_RUN_PLAN, PK_RUN_PLAN, JSON_RUN_PLAN)
+}
+
+# tables written when large message bodies are stored as files, column message_file holds the name of the file
+TABLES_OFFLOADED_BODIES = {
+    'tickets_messages_content': TableSchema(FIELDS_TICKETS_MESSAGES_CONTENT + ['message_file'],
+                                            FIELDS_R_TICKETS_MESSAGES_CONTENT + ['message_file'],
+                                            PK_TICKETS_MESSAGES_CONTENT, JSON_TICKETS_MESSAGES_CONTENT)
+}
+
+
+def get_column_types(tableSchema):
+    """
+    Types of columns in columnar output: numeric columns of the table are floats, date, date_* and other date
+    columns in TIMESTAMP_FIELDS are timestamps and all other columns are strings.
+    """
+
+    types = []
+
+    for field in tableSchema.fieldsRenamed:
+        if field in tableSchema.numericFields:
+            types += ['float']
+        elif field == 'date' or field.startswith('date_') or field in TIMESTAMP_FIELDS:
+            types += ['timestamp']
+        else:
+            types += ['string']
+
+    return types
+
+
+def to_float(value):
+
+    if value is None or value == '':
+        return None
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_timestamp(value):
+    """
+    Parses dates of the API. Dates in other ISO 8601 formats, e.g. with T separator or an offset, are parsed
+    by parse_date and dates with an offset are converted to UTC. Returns None for values, which are not dates.
+    """
+
+    if not value:
+        return None
+
+    _value = str(value)
+
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.datetime.strptime(_value, fmt)
+        except ValueError:
+            continue
+
+    # relative dates (today, 2 days ago) are parsed by parse_date too, but are not dates of the API
+    _date = parse_date(_value) if _value[:1].isdigit() else None
+
+    if _date is None:
+        return None
+
+    if _date.tzinfo is not None:
+        _date = _date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return _date.replace(microsecond=0)
+
+
+def to_string(value):
+
+    return None if value is None else str(value)
+
+
+CONVERTERS = {'float': to_float, 'timestamp': to_timestamp, 'string': to_string}
+
+
+class RowProjector:
+    """
+    Projects API rows onto the columns of a table. A getter is compiled once per column, so each row is read only
+    for the fields which are written, instead of being flattened as a whole.
+
+    Columns are matched the same way flattened JSON keys are, i.e. column "a_b_c" is taken from the top level key
+    "a_b_c" if it holds a value, and otherwise from nested objects such as {"a": {"b_c": ...}} or
+    {"a_b": {"c": ...}}. JSON columns are always serialized from the top level key.
+    """
+
+    def __init__(self, fields, jsonFields):
+
+        self.fields = fields
+        self.index = {field: idx for idx, field in enumerate(fields)}
+        self.getters = [self.compile_json_getter(field) if field in jsonFields else self.compile_getter(field)
+                        for field in fields]
+
+    def project(self, row, parentDict=None):
+
+        _row = [getter(row) for getter in self.getters]
+
+        if parentDict is not None:
+            for key, value in parentDict.items():
+                idx = self.index.get(key)
+                if idx is not None:
+                    _row[idx] = value
+
+        return _row
+
+    @staticmethod
+    def compile_json_getter(field):
+
+        def getter(row):
+            return codec.dumps(row.get(field))
+
+        return getter
+
+    @classmethod
+    def compile_getter(cls, field):
+
+        nested_paths = cls.split_paths(field.split('_'))[1:]
+
+        if not nested_paths:
+            def getter(row):
+                value = row.get(field)
+                return '' if type(value) is dict else value
+
+            return getter
+
+        def getter_nested(row):
+            value = row.get(field, _MISSING)
+
+            if value is not _MISSING and type(value) is not dict:
+                return value
+
+            for path in nested_paths:
+                value = row
+
+                for key in path:
+                    if type(value) is not dict:
+                        value = _MISSING
+                        break
+                    value = value.get(key, _MISSING)
+
+                if value is not _MISSING and type(value) is not dict:
+                    return value
+
+            return ''
+
+        return getter_nested
+
+    @classmethod
+    def split_paths(cls, parts):
+        """
+        Lists all ways in which underscore separated parts of a column name can be grouped into nested keys,
+        starting with the column name itself.
+        """
+
+        if len(parts) == 1:
+            return [tuple(parts)]
+
+        paths = []
+
+        for idx in range(len(parts), 0, -1):
+            head = '_'.join(parts[:idx])
+
+            if idx == len(parts):
+                paths += [(head,)]
+            else:
+                paths += [(head, *tail) for tail in cls.split_paths(parts[idx:])]
+
+        return paths
+
+
+class QuotedRowWriter:
+    """
+    Writes rows with all values quoted, producing the same output as csv.writer with QUOTE_ALL and the default
+    "\r\n" line terminator. Values are quoted by a plain string join, which is several times faster than the csv
+    module for tables with long text values, such as message bodies.
+    """
+
+    def __init__(self, file):
+
+        self.file = file
+
+    @staticmethod
+    def quote(value):
+
+        return '""' if value is None else '"' + str(value).replace('"', '""') + '"'
+
+    def writerows(self, rows):
+
+        _quote = self.quote
+        self.file.writelines([','.join([_quote(value) for value in row]) + '\r\n' for row in rows])
+
+
+_MISSING = object()
+
+
+class RowHashIndex:
+    """
+    Index of primary key -> hash of the written row, used to skip rows which did not change since the previous run.
+    Both the key and the row are stored as truncated blake2b digests of ROW_HASH_SIZE bytes, so the index is
+    serialized as concatenated fixed size records, compressed with zlib and encoded with base64 to fit in the state.
+
+    Rows which are written are moved to the end of the index, the index is truncated to ROW_HASH_MAX_ROWS most
+    recently written rows. Digests do not compress, so every row takes about 21 bytes of the state (1 MB per table
+    at the limit). Older rows, which fall out of the index, are written again when they are downloaded.
+    """
+
+    def __init__(self, fieldsRenamed, primaryKey, encoded=None):
+
+        self.pkIndexes = [fieldsRenamed.index(key) for key in primaryKey]
+        self.hashes = self.decode(encoded) if encoded else {}
+        self.skipped = 0
+
+    @staticmethod
+    def digest(values):
+
+        _value = '\x1f'.join(['' if v is None else str(v) for v in values])
+        return hashlib.blake2b(_value.encode('utf-8'), digest_size=ROW_HASH_SIZE).digest()
+
+    def filter(self, rows):
+
+        _changed = []
+        _hashes = self.hashes
+        _digest = self.digest
+
+        for row in rows:
+            _key = _digest([row[idx] for idx in self.pkIndexes])
+            _hash = _digest(row)
+
+            if _hashes.get(_key) == _hash:
+                self.skipped += 1
+                continue
+
+            _hashes.pop(_key, None)
+            _hashes[_key] = _hash
+            _changed += [row]
+
+        return _changed
+
+    def decode(self, encoded):
+
+        _raw = zlib.decompress(base64.b64decode(encoded))
+        _record = 2 * ROW_HASH_SIZE
+
+        return {_raw[i:i + ROW_HASH_SIZE]: _raw[i + ROW_HASH_SIZE:i + _record] for i in range(0, len(_raw), _record)}
+
+    def encode(self):
+
+        _items = list(self.hashes.items())[-ROW_HASH_MAX_ROWS:]
+        _raw = b''.join([key + value for key, value in _items])
+
+        return base64.b64encode(zlib.compress(_raw, 9)).decode('ascii')
+
+
+class ContentStore:
+    """
+    Content-addressed store of large message bodies. Bodies of at least thresholdBytes are written to the output
+    files, named by SHA-256 hash of their content, so a body repeated across messages of a run (e.g. a quoted email)
+    is stored only once. Files stored by previous runs are not known, a body is stored again by every run which
+    downloads it. The table then holds the name of the file instead of the body.
+    """
+
+    def __init__(self, filesOutPath, thresholdBytes):
+
+        self.paramPath = filesOutPath
+        self.paramThreshold = thresholdBytes
+        self.stored = set()
+
+    def offload(self, body, bodyFormat=None):
+        """
+        Stores the body, if it is large enough, and returns name of its file. Returns None for smaller bodies.
+        """
+
+        if not body:
+            return None
+
+        _raw = body.encode('utf-8')
+
+        if len(_raw) < self.paramThreshold:
+            return None
+
+        _name = MESSAGE_FILE_PREFIX + hashlib.sha256(_raw).hexdigest() + MESSAGE_FILE_EXTENSIONS.get(bodyFormat, '.txt')
+
+        if _name not in self.stored:
+            _path = os.path.join(self.paramPath, _name)
+
+            with open(_path, 'wb') as file:
+                file.write(_raw)
+
+            with open(_path + '.manifest', 'w') as manifest:
+                json.dump({'tags': ['liveagent', 'liveagent-message-body']}, manifest)
+
+            self.stored.add(_name)
+
+        return _name
+
 
 class LiveAgentWriter:
 
-    def __init__(self, tableOutPath, tableName, incremental):
+    def __init__(self, tableOutPath, tableName, incremental, metrics=None, outputFormat=FORMAT_CSV,
+                 sliceSizeMb=SLICE_SIZE_MB, rowHashes=None, resumeSize=None, tableSchema=None):
 
         self.paramPath = tableOutPath
         self.paramTableName = tableName
         self.paramTable = tableName + '.csv'
         self.paramTablePath = os.path.join(self.paramPath, self.paramTable)
-        self.paramFields = eval(f'FIELDS_{tableName.upper().replace("-", "_")}')
-        self.paramJsonFields = eval(f'JSON_{tableName.upper().replace("-", "_")}')
-        self.paramPrimaryKey = eval(f'PK_{tableName.upper().replace("-", "_")}')
-        self.paramFieldsRenamed = eval(f'FIELDS_R_{tableName.upper().replace("-", "_")}')
+        self.paramTableSchema = TABLES[tableName] if tableSchema is None else tableSchema
+        self.paramFields = self.paramTableSchema.fields
+        self.paramJsonFields = self.paramTableSchema.jsonFields
+        self.paramPrimaryKey = self.paramTableSchema.primaryKey
+        self.paramFieldsRenamed = self.paramTableSchema.fieldsRenamed
         self.paramIncremental = incremental
+        self.paramProjector = RowProjector(self.paramFields, self.paramJsonFields)
+        self.paramOutputFormat = outputFormat
+        self.paramSliceSize = sliceSizeMb * 1024 * 1024
+        self.paramRowHashes = rowHashes
+        self.paramResumeSize = resumeSize
+        self.metrics = metrics
+
+        if self.paramOutputFormat == FORMAT_PARQUET:
+            self.paramTable = tableName + '.parquet'
+            self.paramTablePath = os.path.join(self.paramPath, self.paramTable)
+            self.paramColumnTypes = get_column_types(self.paramTableSchema)
 
         self.createManifest()
         self.createWriter()
 
     def createManifest(self):
 
+        if self.paramOutputFormat == FORMAT_PARQUET:
+            return self.createFileManifest()
+
         template = {
             'incremental': self.paramIncremental,
             'primary_key': self.paramPrimaryKey,
@@ -170,44 +565,149 @@ class LiveAgentWriter:
         with open(path, 'w') as manifest:
             json.dump(template, manifest)
 
+    def createFileManifest(self):
+
+        template = {
+            'is_permanent': True,
+            'tags': ['liveagent', f'liveagent-{self.paramTableName}', self.paramOutputFormat]
+        }
+
+        with open(self.paramTablePath + '.manifest', 'w') as manifest:
+            json.dump(template, manifest)
+
     def createWriter(self):
 
-        self.writer = csv.DictWriter(open(self.paramTablePath, 'w'), fieldnames=self.paramFields,
-                                     restval='', extrasaction='ignore', quotechar='\"', quoting=csv.QUOTE_ALL)
+        if self.paramOutputFormat == FORMAT_PARQUET:
+            self.createParquetWriter()
 
-    def writerows(self, listToWrite, parentDict=None):
+        elif self.paramOutputFormat == FORMAT_CSV_GZIP_SLICED:
+            os.makedirs(self.paramTablePath, exist_ok=True)
+            self.paramSliceNumber = 0
+            self.openSlice()
+
+        elif self.paramResumeSize is not None:
+            # rows written after the checkpoint of a resumed run are discarded, the rest of the table is kept
+            os.truncate(self.paramTablePath, self.paramResumeSize)
+            self.rawFile = None
+            self.file = open(self.paramTablePath, 'a')
+            self.writer = QuotedRowWriter(self.file)
+
+        else:
+            self.rawFile = None
+            self.file = open(self.paramTablePath, 'w')
+            self.writer = QuotedRowWriter(self.file)
+
+    def createParquetWriter(self):
+        """
+        Columnar output written with pyarrow (an optional dependency). Rows are buffered and written
+        in row groups of ROW_GROUP_SIZE rows.
+        """
+
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        pa_types = {'float': pyarrow.float64(), 'timestamp': pyarrow.timestamp('s'), 'string': pyarrow.string()}
+
+        self.rawFile = None
+        self.file = None
+        self.paramRowGroup = []
+        self.paramInvalidValues = 0
+        self.paramSchema = pyarrow.schema([(field, pa_types[col_type]) for field, col_type
+                                           in zip(self.paramFieldsRenamed, self.paramColumnTypes)])
+        self.writer = pyarrow.parquet.ParquetWriter(self.paramTablePath, self.paramSchema,
+                                                    compression=PARQUET_COMPRESSION)
+
+    def writeRowGroup(self):
+
+        if not self.paramRowGroup:
+            return
+
+        arrays = []
+
+        for column, col_type, pa_field in zip(zip(*self.paramRowGroup), self.paramColumnTypes, self.paramSchema):
+            values = [CONVERTERS[col_type](value) for value in column]
 
-        for row in listToWrite:
+            if col_type != 'string':
+                self.paramInvalidValues += sum(1 for raw, value in zip(column, values)
+                                               if value is None and raw not in (None, ''))
 
-            row_f = self.flatten_json(x=row)
+            arrays += [self.pyarrow.array(values, type=pa_field.type)]
 
-            if self.paramJsonFields != []:
-                for field in self.paramJsonFields:
-                    row_f[field] = json.dumps(row[field])
+        self.writer.write_table(self.pyarrow.Table.from_arrays(arrays, schema=self.paramSchema))
+        self.paramRowGroup = []
 
-            _dictToWrite = {}
+    def openSlice(self):
+        """
+        Opens the next gzip compressed part of a sliced table. Parts are written without a header, columns
+        are specified in the manifest of the table.
+        """
 
-            for key, value in row_f.items():
+        self.paramSliceNumber += 1
+        path = os.path.join(self.paramTablePath, f'part{self.paramSliceNumber:05d}.csv.gz')
 
-                if key in self.paramFields:
-                    _dictToWrite[key] = value
+        self.rawFile = open(path, 'wb')
+        self.file = io.TextIOWrapper(gzip.GzipFile(fileobj=self.rawFile, mode='wb', compresslevel=GZIP_LEVEL),
+                                     encoding='utf-8', newline='')
+        self.writer = QuotedRowWriter(self.file)
 
-                else:
-                    continue
+    def closeFile(self):
 
-            if parentDict is not None:
-                _dictToWrite = {**_dictToWrite, **parentDict}
+        if self.paramOutputFormat == FORMAT_PARQUET:
+            self.writeRowGroup()
+            self.writer.close()
 
-            self.writer.writerow(_dictToWrite)
+            if self.paramInvalidValues:
+                logging.warning(f"Table {self.paramTableName}: {self.paramInvalidValues} values are not valid "
+                                f"numbers or dates and were written as nulls.")
 
-    def flatten_json(self, x, out=None, name=''):
-        if out is None:
-            out = dict()
+            return
+
+        self.file.close()
+
+        if self.rawFile is not None:
+            self.rawFile.close()
+
+    def writepages(self, pagesToWrite, parentDict=None):
+
+        for page in pagesToWrite:
+            self.writerows(page, parentDict=parentDict)
+
+    def flush(self):
+        """
+        Flushes written rows of a CSV table to the file and returns the size of the file, used to checkpoint the table.
+        """
+
+        self.file.flush()
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self):
+
+        self.closeFile()
+
+    def writerows(self, listToWrite, parentDict=None):
+
+        _start = time.perf_counter()
+
+        _project = self.paramProjector.project
+        _rows = [_project(row, parentDict) for row in listToWrite]
+
+        if self.paramRowHashes is not None:
+            _rows = self.paramRowHashes.filter(_rows)
+
+        if self.paramOutputFormat == FORMAT_PARQUET:
+            self.paramRowGroup += _rows
+
+            if len(self.paramRowGroup) >= ROW_GROUP_SIZE:
+                self.writeRowGroup()
 
-        if type(x) is dict:
-            for a in x:
-                self.flatten_json(x[a], out, name + a + '_')
         else:
-            out[name[:-1]] = x
+            self.writer.writerows(_rows)
+
+        if self.rawFile is not None and self.rawFile.tell() >= self.paramSliceSize:
+            self.closeFile()
+            self.openSlice()
 
-        return out
+        if self.metrics is not None:
+            self.metrics.record_write(self.paramTableName, len(_rows), time.perf_counter() - _start,
+                                      len(listToWrite) - len(_rows))
@@ -1,6 +1,144 @@
+import datetime
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+ISO_DATE = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?'
+                      r'(Z|[+-]\d{2}:?\d{2})?')
+RELATIVE_DATE = re.compile(r'(\d+) (second|minute|hour|day|week)s? ago')
+RELATIVE_DAYS = {'now': 0, 'today': 0, 'yesterday': 1}
+
+
+class ClientException(Exception):
+    pass
+
+
 class Parameters:
     pass
 
 
 class Writers:
     pass
+
+
+def parse_date(value: str) -> Optional[datetime.datetime]:
+    """
+    Parses ISO dates (2026-01-31, 2026-01-31 12:00:00, 2026-01-31T12:00:00.000+02:00) and simple relative dates
+    (now, today, yesterday, 30 days ago) the same way dateparser does. Returns None for all other values, which
+    are left to dateparser.
+    """
+
+    _value = value.strip().lower()
+    _iso = ISO_DATE.fullmatch(_value.upper())
+
+    if _iso is not None:
+        year, month, day, hour, minute, second, fraction, offset = _iso.groups()
+        _tz = None
+
+        if offset == 'Z':
+            _tz = datetime.timezone.utc
+        elif offset is not None:
+            _offset = datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[-2:]))
+            _tz = datetime.timezone(-_offset if offset[0] == '-' else _offset)
+
+        try:
+            return datetime.datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+                                     int(second or 0), int((fraction or '0').ljust(6, '0')), _tz)
+        except ValueError:
+            return None
+
+    if _value in RELATIVE_DAYS:
+        return datetime.datetime.now() - datetime.timedelta(days=RELATIVE_DAYS[_value])
+
+    _relative = RELATIVE_DATE.fullmatch(_value)
+
+    if _relative is not None:
+        return datetime.datetime.now() - datetime.timedelta(**{_relative.group(2) + 's': int(_relative.group(1))})
+
+    return None
+
+
+def ordered_map(func: Callable, items: Iterable, max_workers: int = 1, max_pending: int = None,
+                size: Callable[[Any], int] = None,
+                max_pending_size: int = None) -> Iterator[Tuple[Any, Any, Exception]]:
+    """
+    Applies func to every item on a pool of max_workers threads and yields (item, result, exception) tuples
+    in the order of the input. At most max_pending items are scheduled ahead of the consumer, so results are
+    streamed rather than collected. Exceptions raised by func are returned, not raised, so the caller can decide
+    whether a single failed item is fatal.
+
+    If size is provided, no further items are scheduled while the results of scheduled items are expected to be
+    larger than max_pending_size in total (e.g. bytes of downloaded pages), which bounds memory of the results
+    rather than only their count.
+    """
+
+    if max_workers <= 1:
+        for item in items:
+            yield _call(func, item)[:3]
+        return
+
+    if max_pending is None:
+        max_pending = max_workers * 2
+
+    pending = deque()
+    budget = PendingBudget(max_pending_size)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in items:
+                pending.append((item, executor.submit(_call, func, item, size)))
+
+                while pending and (len(pending) >= max_pending or budget.is_exceeded(pending)):
+                    yield budget.consume(pending.popleft()[1].result())
+
+            while pending:
+                yield budget.consume(pending.popleft()[1].result())
+
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+class PendingBudget:
+    """
+    Limit on the total size of results of items scheduled by ordered_map. Results which are not finished yet are
+    expected to be of the average size of all finished results.
+    """
+
+    def __init__(self, max_size: int = None):
+
+        self.max_size = max_size
+        self.consumed_size = 0
+        self.consumed = 0
+
+    def consume(self, result: Tuple[Any, Any, Exception, int]) -> Tuple[Any, Any, Exception]:
+
+        self.consumed_size += result[3]
+        self.consumed += 1
+
+        return result[:3]
+
+    def is_exceeded(self, pending: Iterable[Tuple[Any, Future]]) -> bool:
+
+        if self.max_size is None:
+            return False
+
+        _sizes = [future.result()[3] for _, future in pending if future.done()]
+        _finished = self.consumed + len(_sizes)
+
+        if _finished == 0:
+            return False
+
+        _average = (self.consumed_size + sum(_sizes)) / _finished
+        return sum(_sizes) + (len(pending) - len(_sizes)) * _average >= self.max_size
+
+
+def _call(func: Callable, item: Any, size: Callable[[Any], int] = None) -> Tuple[Any, Any, Exception, int]:
+
+    try:
+        result = func(item)
+    except Exception as e:
+        return item, None, e, 0
+
+    return item, result, None, size(result) if size is not None else 0
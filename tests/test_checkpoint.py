@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from liveagent.checkpoint import Checkpoint, CHECKPOINT_FILE
+from liveagent.result import LiveAgentWriter
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.path, CHECKPOINT_FILE)
+        self.rows = [{'id': str(idx), 'name': f'Tag "{idx}"', 'color': 'red'} for idx in range(10)]
+
+    def read_table(self):
+
+        with open(os.path.join(self.path, 'tags.csv'), newline='') as file:
+            return file.read()
+
+    def test_resume_truncates_rows_after_checkpoint(self):
+
+        writer = LiveAgentWriter(self.path, 'tags', True)
+        writer.writerows(self.rows)
+        writer.close()
+        _full = self.read_table()
+
+        # the run stops after rows were written past the last checkpoint
+        checkpoint = Checkpoint(self.checkpoint_path, 'config', 0)
+        writer = LiveAgentWriter(self.path, 'tags', True)
+        writer.writerows(self.rows[:5])
+        checkpoint.commit('tags', {'page': 2}, {'tags': writer.flush()})
+        writer.writerows(self.rows[5:7])
+        writer.close()
+
+        checkpoint = Checkpoint(self.checkpoint_path, 'config', 0)
+        _record = checkpoint.get('tags')
+
+        self.assertTrue(checkpoint.resumed)
+        self.assertEqual(_record['position'], {'page': 2})
+
+        writer = LiveAgentWriter(self.path, 'tags', True, resumeSize=_record['tables']['tags'])
+        writer.writerows(self.rows[5:])
+        checkpoint.complete('tags', {'tags': writer.flush()})
+        writer.close()
+
+        self.assertEqual(self.read_table(), _full)
+        self.assertEqual(Checkpoint(self.checkpoint_path, 'config', 0).get('tags'),
+                         {'tables': {'tags': len(_full.encode('utf-8'))}, 'done': True})
+
+    def test_changed_configuration_starts_from_beginning(self):
+
+        checkpoint = Checkpoint(self.checkpoint_path, 'config', 0)
+        checkpoint.commit('tags', {'page': 2}, {'tags': 100})
+
+        checkpoint = Checkpoint(self.checkpoint_path, 'changed config', 0)
+
+        self.assertFalse(checkpoint.resumed)
+        self.assertEqual(checkpoint.get('tags'), {})
+
+    def test_unreadable_checkpoint_starts_from_beginning(self):
+
+        with open(self.checkpoint_path, 'w') as file:
+            file.write('{"version": 1, "finger')
+
+        self.assertFalse(Checkpoint(self.checkpoint_path, 'config', 0).resumed)
+
+    def test_commit_is_saved_after_interval(self):
+
+        checkpoint = Checkpoint(self.checkpoint_path, 'config', 3600)
+        checkpoint.commit('tags', {'page': 2}, {'tags': 100})
+
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+        checkpoint.complete('tags', {'tags': 200})
+
+        self.assertEqual(Checkpoint(self.checkpoint_path, 'config', 3600).get('tags'),
+                         {'tables': {'tags': 200}, 'done': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
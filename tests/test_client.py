@@ -0,0 +1,154 @@
+import datetime
+import json
+import unittest
+
+from liveagent.client import LiveAgentClient, DATE_FORMAT
+from liveagent.endpoints import PAGE_LIMIT
+from liveagent.utils import ClientException
+
+
+def conversation(id, date):
+
+    return {'conversationid': id, 'datechanged': date}
+
+
+class TestSplitWindow(unittest.TestCase):
+
+    def test_splits_to_contiguous_windows(self):
+
+        windows = LiveAgentClient._split_window('2026-01-01 00:00:00', '2026-01-02 00:00:00', 4, 3600)
+
+        self.assertEqual(windows, [('2026-01-01 00:00:00', '2026-01-01 06:00:00'),
+                                   ('2026-01-01 06:00:00', '2026-01-01 12:00:00'),
+                                   ('2026-01-01 12:00:00', '2026-01-01 18:00:00'),
+                                   ('2026-01-01 18:00:00', '2026-01-02 00:00:00')])
+
+    def test_windows_are_not_shorter_than_min_span(self):
+
+        windows = LiveAgentClient._split_window('2026-01-01 00:00:00', '2026-01-01 03:00:00', 10, 3600)
+
+        self.assertEqual(len(windows), 3)
+        self.assertEqual([window[0] for window in windows[1:]], [window[1] for window in windows[:-1]])
+
+    def test_short_or_invalid_range_is_single_window(self):
+
+        self.assertEqual(LiveAgentClient._split_window('2026-01-01 00:00:00', '2026-01-01 01:30:00', 4, 3600),
+                         [('2026-01-01 00:00:00', '2026-01-01 01:30:00')])
+        self.assertEqual(LiveAgentClient._split_window('2026-01-01', 'now', 4, 3600), [('2026-01-01', 'now')])
+
+
+class TestNextKeysetPage(unittest.TestCase):
+
+    def test_moves_watermark_to_last_row(self):
+
+        position = {}
+        page = [conversation('a', '2026-01-01 10:00:00'), conversation('b', '2026-01-01 10:00:01')]
+
+        self.assertEqual(LiveAgentClient._next_keyset_page(page, position, 2), page)
+        self.assertEqual(position, {'watermark': '2026-01-01 10:00:01', 'ids': ['b'], 'complete': False, 'skip': 0})
+
+    def test_skips_downloaded_rows_with_same_date(self):
+
+        position = {'watermark': '2026-01-01 10:00:01', 'ids': ['b'], 'skip': 0}
+        page = [conversation('b', '2026-01-01 10:00:01'), conversation('c', '2026-01-01 10:00:01'),
+                conversation('d', '2026-01-01 10:00:02')]
+
+        self.assertEqual(LiveAgentClient._next_keyset_page(page, position, 3), page[1:])
+        self.assertEqual(position, {'watermark': '2026-01-01 10:00:02', 'ids': ['d'], 'complete': False, 'skip': 0})
+
+    def test_full_page_with_same_date_is_skipped_by_offset(self):
+
+        position = {'watermark': '2026-01-01 10:00:00', 'ids': ['a'], 'skip': 0}
+        page = [conversation(id, '2026-01-01 10:00:00') for id in ['a', 'b', 'c']]
+
+        self.assertEqual(LiveAgentClient._next_keyset_page(page, position, 3), page[1:])
+        self.assertEqual(position, {'watermark': '2026-01-01 10:00:00', 'ids': ['a', 'b', 'c'], 'complete': False,
+                                    'skip': 3})
+
+        page = [conversation('d', '2026-01-01 10:00:00')]
+
+        self.assertEqual(LiveAgentClient._next_keyset_page(page, position, 3), page)
+        self.assertEqual(position['ids'], ['a', 'b', 'c', 'd'])
+        self.assertTrue(position['complete'])
+
+    def test_keeps_rows_without_date(self):
+
+        position = {'watermark': '2026-01-01 10:00:00', 'ids': ['a']}
+        page = [conversation('b', None), conversation('c', '2026-01-01 10:00:05'), {'conversationid': 'd'}]
+
+        self.assertEqual(LiveAgentClient._next_keyset_page(page, position, 3), page)
+        self.assertEqual(position['watermark'], '2026-01-01 10:00:05')
+
+    def test_unsorted_page_raises(self):
+
+        page = [conversation('a', '2026-01-01 10:00:05'), conversation('b', '2026-01-01 10:00:00')]
+
+        with self.assertRaises(ClientException):
+            LiveAgentClient._next_keyset_page(page, {}, 2)
+
+    def test_rows_before_watermark_raise(self):
+
+        position = {'watermark': '2026-01-01 10:00:05', 'ids': ['a']}
+        page = [conversation('b', '2026-01-01 09:00:00'), conversation('c', '2026-01-01 10:00:06')]
+
+        with self.assertRaises(ClientException):
+            LiveAgentClient._next_keyset_page(page, position, 2)
+
+
+class TestShardedRequest(unittest.TestCase):
+    """
+    Windows of a sharded request of companies are downloaded from rows in memory, filtered by both bounds
+    of the window.
+    """
+
+    def setUp(self):
+
+        _start = datetime.datetime(2026, 1, 1)
+        # a row every 5 seconds in the first hour and every minute later, so rows fall on the bounds of windows
+        # and only the first window is dense
+        _seconds = list(range(0, 3600, 5)) + list(range(3600, 5 * 3600, 60))
+        self.rows = [{'id': f'r{idx}', 'date_changed': (_start + datetime.timedelta(seconds=second)).strftime(
+            DATE_FORMAT)} for idx, second in enumerate(_seconds)]
+        self.expected = sorted(row['id'] for row in self.rows if row['date_changed'] <= '2026-01-01 04:00:00')
+        self.requests = []
+
+        self.client = LiveAgentClient('token', 'token', 'example', '2026-01-01 00:00:00', '2026-01-01 04:00:00',
+                                      date_shards=4)
+        self.client._get_paged_request = self.get_paged_request
+
+    @staticmethod
+    def create_filter(filter_field, date_from, date_until=None):
+
+        return json.dumps([date_from, date_until])
+
+    def get_paged_request(self, endpoint, parameters=None, **kwargs):
+
+        date_from, date_until = json.loads(parameters['_filters'])
+        rows = [row for row in self.rows if date_from <= row['date_changed'] <= date_until]
+
+        for idx in range(0, len(rows), PAGE_LIMIT):
+            self.requests += [(date_from, date_until)]
+            yield rows[idx:idx + PAGE_LIMIT]
+
+    def get_rows(self, min_span):
+
+        pages = self.client._get_sharded_request('companies', self.create_filter, min_span=min_span)
+        return [row for page in pages for row in page]
+
+    def test_rows_on_bounds_are_deduplicated(self):
+
+        rows = self.get_rows(3600)
+
+        self.assertEqual(sorted(row['id'] for row in rows), self.expected)
+        self.assertEqual(len(set(self.requests)), 4)
+
+    def test_bisected_windows_are_deduplicated(self):
+
+        rows = self.get_rows(600)
+
+        self.assertEqual(sorted(row['id'] for row in rows), self.expected)
+        self.assertGreater(len(set(self.requests)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import csv
+import datetime
+import io
+import json
+import unittest
+from unittest import mock
+
+from liveagent import result
+from liveagent.result import QuotedRowWriter, RowHashIndex, RowProjector, get_column_types, to_timestamp
+
+
+def flatten_json(x, out=None, name=''):
+    """
+    Flattening of rows used by the writer before rows were projected by RowProjector.
+    """
+
+    if out is None:
+        out = dict()
+
+    if type(x) is dict:
+        for a in x:
+            flatten_json(x[a], out, name + a + '_')
+    else:
+        out[name[:-1]] = x
+
+    return out
+
+
+def legacy_row(fields, jsonFields, row, parentDict=None):
+
+    row_f = flatten_json(row)
+
+    for field in jsonFields:
+        row_f[field] = json.dumps(row[field])
+
+    _dictToWrite = {key: value for key, value in row_f.items() if key in fields}
+
+    if parentDict is not None:
+        _dictToWrite = {**_dictToWrite, **parentDict}
+
+    return [_dictToWrite.get(field, '') for field in fields]
+
+
+def csv_rows(rows):
+
+    out = io.StringIO()
+    csv.writer(out, quotechar='\"', quoting=csv.QUOTE_ALL).writerows(rows)
+    return out.getvalue()
+
+
+class TestRowProjector(unittest.TestCase):
+
+    def assertProjectedAsLegacy(self, table, rows, parentDict=None):
+
+        _schema = result.TABLES[table]
+        _projector = RowProjector(_schema.fields, _schema.jsonFields)
+
+        for row in rows:
+            self.assertEqual(csv_rows([_projector.project(row, parentDict)]),
+                             csv_rows([legacy_row(_schema.fields, _schema.jsonFields, row, parentDict)]))
+
+    def test_tickets(self):
+
+        rows = [
+            {'id': 't1', 'owner_contactid': 'c1', 'owner_email': 'john@example.com', 'owner_name': 'John',
+             'status': 'R', 'tags': ['vip', 'billing'], 'date_created': '2021-01-01 10:00:00', 'date_due': None,
+             'custom_fields': [{'code': 'field', 'value': 'váluе "quoted"'}], 'extra': {'nested': {'deep': 1}}},
+            {'id': 't2', 'tags': [], 'custom_fields': None, 'owner': {'email': 'nested@example.com'}}
+        ]
+
+        self.assertProjectedAsLegacy('tickets', rows)
+
+    def test_nested_fields(self):
+
+        rows = [
+            {'id': 'a1', 'name': 'Agent', 'online': {'status': 'N'}, 'avatar': {'url': 'https://example.com'}},
+            {'id': 'a2', 'online_status': {'nested': 'dict'}},
+            {'id': 'a3', 'online': {'status': 'N'}, 'avatar_url': None, 'gender': ''}
+        ]
+
+        self.assertProjectedAsLegacy('agents', rows)
+
+    def test_parent_dict(self):
+
+        rows = [{'id': 'a1', 'contactid': 'c1', 'firstname': 'F', 'worktime': '1.5', 'answers': 3}]
+
+        self.assertProjectedAsLegacy('agent_report', rows, parentDict={'date': '2021-01-01'})
+
+
+class TestQuotedRowWriter(unittest.TestCase):
+
+    def test_same_as_csv_writer(self):
+
+        rows = [['a"b', 'line\r\nbreak', None, '', 1, 2.5, True, 'ž', 1e20, '\t,;'], []]
+
+        out = io.StringIO()
+        QuotedRowWriter(out).writerows(rows)
+
+        self.assertEqual(out.getvalue(), csv_rows(rows))
+
+
+class TestRowHashIndex(unittest.TestCase):
+
+    def test_encode_decode(self):
+
+        index = RowHashIndex(['id', 'name'], ['id'])
+        index.filter([[str(idx), f'name {idx}'] for idx in range(100)])
+
+        decoded = RowHashIndex(['id', 'name'], ['id'], index.encode())
+
+        self.assertEqual(list(decoded.hashes.items()), list(index.hashes.items()))
+
+    def test_skips_unchanged_rows(self):
+
+        index = RowHashIndex(['id', 'name'], ['id'])
+        index.filter([['1', 'a'], ['2', 'b']])
+
+        index = RowHashIndex(['id', 'name'], ['id'], index.encode())
+
+        self.assertEqual(index.filter([['1', 'a'], ['2', 'changed'], ['3', 'c']]), [['2', 'changed'], ['3', 'c']])
+        self.assertEqual(index.skipped, 1)
+
+    def test_keeps_most_recently_written_rows(self):
+
+        index = RowHashIndex(['id', 'name'], ['id'])
+        index.filter([[str(idx), 'a'] for idx in range(5)])
+        # row 0 is unchanged and keeps its place, row 1 is written again and moves to the end
+        index.filter([['0', 'a'], ['1', 'changed']])
+
+        with mock.patch.object(result, 'ROW_HASH_MAX_ROWS', 3):
+            _encoded = index.encode()
+
+        index = RowHashIndex(['id', 'name'], ['id'], _encoded)
+
+        self.assertEqual(list(index.hashes), [RowHashIndex.digest([str(idx)]) for idx in [3, 4, 1]])
+        self.assertEqual(index.filter([[str(idx), 'a'] for idx in range(5)]), [['0', 'a'], ['1', 'a'], ['2', 'a']])
+
+
+class TestColumnTypes(unittest.TestCase):
+
+    def test_to_timestamp(self):
+
+        _date = datetime.datetime(2026, 1, 31, 12, 0, 0)
+
+        self.assertEqual(to_timestamp('2026-01-31 12:00:00'), _date)
+        self.assertEqual(to_timestamp('2026-01-31T12:00:00'), _date)
+        self.assertEqual(to_timestamp('2026-01-31T14:00:00.250+02:00'), _date)
+        self.assertEqual(to_timestamp('2026-01-31T12:00:00Z'), _date)
+        self.assertIsNone(to_timestamp('today'))
+        self.assertIsNone(to_timestamp('not a date'))
+
+    def test_last_activity_is_timestamp(self):
+
+        types = dict(zip(result.TABLES['tickets'].fieldsRenamed, get_column_types(result.TABLES['tickets'])))
+
+        self.assertEqual(types['last_activity'], 'timestamp')
+        self.assertEqual(types['last_activity_public'], 'timestamp')
+
+
+if __name__ == '__main__':
+    unittest.main()
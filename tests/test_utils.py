@@ -0,0 +1,89 @@
+import datetime
+import time
+import unittest
+
+import dateparser
+
+from liveagent.utils import ordered_map, parse_date
+
+
+class TestParseDate(unittest.TestCase):
+
+    def test_iso_dates_as_dateparser(self):
+
+        for value in ['2026-01-31', '2026-01-31 12:00:00', '2026-01-31 12:00', '2026-01-31T12:00:00',
+                      '2026-01-31T12:00:00Z', '2026-01-31T12:00:00.123+02:00', ' 2026-01-31 ']:
+            with self.subTest(value=value):
+                self.assertEqual(parse_date(value), dateparser.parse(value))
+
+    def test_relative_dates_as_dateparser(self):
+
+        for value in ['now', 'today', 'yesterday', '30 days ago', '1 day ago', '2 weeks ago', '12 hours ago',
+                      '5 minutes ago', 'Yesterday']:
+            with self.subTest(value=value):
+                self.assertAlmostEqual(parse_date(value), dateparser.parse(value),
+                                       delta=datetime.timedelta(seconds=5))
+
+    def test_other_values_are_left_to_dateparser(self):
+
+        for value in ['last monday', '31.01.2026', 'January 31, 2026', '2026-02-30', 'in 2 days']:
+            with self.subTest(value=value):
+                self.assertIsNone(parse_date(value))
+
+
+class TestOrderedMap(unittest.TestCase):
+
+    def test_keeps_order_of_input(self):
+
+        def _slow_first(item):
+            time.sleep(0.01 * (10 - item))
+            return item * 2
+
+        results = list(ordered_map(_slow_first, range(10), max_workers=4))
+
+        self.assertEqual([(item, item * 2, None) for item in range(10)], results)
+
+    def test_returns_exceptions(self):
+
+        def _fail_odd(item):
+            if item % 2:
+                raise ValueError(item)
+            return item
+
+        results = list(ordered_map(_fail_odd, range(4), max_workers=2))
+
+        self.assertEqual([item for item, _, exc in results if exc is None], [0, 2])
+        self.assertEqual([type(exc) for _, _, exc in results if exc is not None], [ValueError, ValueError])
+
+    def test_limits_pending_items(self):
+
+        pulled = []
+
+        def _items():
+            for item in range(20):
+                pulled.append(item)
+                yield item
+
+        for item, _, _ in ordered_map(lambda item: item, _items(), max_workers=4, max_pending=3):
+            self.assertLessEqual(len(pulled) - item, 3)
+
+    def test_limits_pending_size(self):
+
+        pulled = []
+
+        def _items():
+            for item in range(20):
+                pulled.append(item)
+                yield item
+
+                # the size of the first result is known before the following items are scheduled
+                if item == 0:
+                    time.sleep(0.1)
+
+        for item, _, _ in ordered_map(lambda item: 'x' * 10, _items(), max_workers=4, max_pending=100, size=len,
+                                      max_pending_size=30):
+            self.assertLessEqual(len(pulled) - item, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()